@@ -0,0 +1,98 @@
+import re
+from typing import Dict, List
+
+import pandas as pd
+
+from post_metrics import CTA_PHRASES, EMOJI_RANGES
+from tracing import get_tracer
+
+ANALYTICS_COLUMNS = ['Date', 'Template', 'Characters', 'Words', 'Hashtags', 'Engagement_Score', 'Readability']
+
+_CTA_PATTERN = '|'.join(re.escape(phrase) for phrase in CTA_PHRASES)
+_READABILITY_BINS = [float('-inf'), 15, 20, 25, float('inf')]
+_READABILITY_LABELS = ["Excellent", "Good", "Fair", "Needs Improvement"]
+
+def compute_metrics_frame(contents: pd.Series) -> pd.DataFrame:
+    """Vectorized equivalent of calculate_post_metrics over a column of post texts"""
+    # Object dtype keeps Python regex semantics (Unicode \w and \s) rather than the Arrow/RE2 engine
+    contents = contents.astype(str).astype(object)
+    characters = contents.str.len()
+    words = contents.str.count(r'\S+')
+    hashtags = contents.str.count(r'#\w+')
+
+    engagement = (
+        contents.str.count(r'\?') * 2
+        + contents.str.count('!') * 1.5
+        + contents.str.count(f'[{EMOJI_RANGES}]') * 1.2
+        + contents.str.lower().str.contains(_CTA_PATTERN, regex=True).astype(int) * 3
+        + characters.between(100, 1300).astype(int) * 5
+        + (hashtags * 0.5).clip(upper=4)
+    )
+    engagement_score = (engagement / 2).clip(upper=10)
+
+    sentences = contents.str.count(r'[.!?]+') + 1
+    readability = pd.cut(words / sentences, bins=_READABILITY_BINS, labels=_READABILITY_LABELS).astype(str)
+
+    return pd.DataFrame({
+        'Characters': characters,
+        'Words': words,
+        'Hashtags': hashtags,
+        'Engagement_Score': engagement_score.astype(float),
+        'Readability': readability
+    }, index=contents.index)
+
+class AnalyticsTable:
+    """Columnar per-post analytics indexed by post id, appended to as posts are generated"""
+
+    def __init__(self, posts: List[Dict] = None):
+        self._reset(posts or [])
+
+    def _reset(self, posts: List[Dict]) -> None:
+        self._frame = pd.DataFrame(columns=ANALYTICS_COLUMNS)
+        self._pending: List[Dict] = []
+        self.last_id = 0
+        self.append(posts)
+
+    def append(self, posts: List[Dict]) -> None:
+        # Metrics are computed lazily for all pending rows in one vectorized pass
+        for post in posts:
+            self._pending.append({
+                'id': post['id'],
+                'timestamp': post['timestamp'],
+                'template': post['template'],
+                'content': post['content']
+            })
+            self.last_id = max(self.last_id, post['id'])
+
+    def remove(self, post_id: int) -> None:
+        self._flush()
+        self._frame = self._frame.drop(index=post_id, errors='ignore')
+
+    def sync(self, store) -> None:
+        """Pick up posts added to the history store since the last sync"""
+        self.append(store.posts_after(self.last_id))
+        if len(self) != store.count():
+            # Posts were deleted elsewhere; rebuild from the store
+            self._reset(store.posts_after(0))
+
+    def _flush(self) -> None:
+        if not self._pending:
+            return
+        with get_tracer().span("analytics.build", rows=len(self._pending)):
+            pending = pd.DataFrame(self._pending).set_index('id')
+            self._pending = []
+            rows = compute_metrics_frame(pending['content'])
+            rows.insert(0, 'Template', pending['template'])
+            rows.insert(0, 'Date', pd.to_datetime(pending['timestamp']).dt.date)
+            if self._frame.empty:
+                self._frame = rows[ANALYTICS_COLUMNS]
+            else:
+                self._frame = pd.concat([self._frame, rows[ANALYTICS_COLUMNS]])
+
+    @property
+    def frame(self) -> pd.DataFrame:
+        self._flush()
+        return self._frame
+
+    def __len__(self) -> int:
+        return len(self._frame) + len(self._pending)
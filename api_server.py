@@ -0,0 +1,340 @@
+"""Headless JSON API for post generation, metrics and images
+
+Usage: python api_server.py [--host HOST] [--port P] [--workers N]
+       (or: uvicorn api_server:app)
+
+The Gemini API key comes from the X-Goog-Api-Key header, or GEMINI_API_KEY when the header is absent.
+Requests share the response cache, model cache and per-key rate limiter with any Streamlit page in the
+same process; each --workers process has its own limiter, so keep one worker per key on the free tier.
+
+POST /v1/posts         {"template", "input", "settings", "variants", "use_cache", "image"} -> post, metrics
+POST /v1/posts/batch   {"items": [post request, ...], "concurrency"} -> one result or error per item
+POST /v1/posts/stream  post request -> NDJSON lines {"chunk": ...}, then the /v1/posts result with "done"
+POST /v1/metrics       {"text"} -> metrics
+POST /v1/images        {"text", "template", "size", "format", "quality"} -> image bytes
+GET  /v1/templates, GET /healthz
+"""
+import argparse
+import asyncio
+import base64
+import json
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from dataclasses import asdict, dataclass
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+from gemini_client import CallStats
+from image_options import DEFAULT_QUALITY, DEFAULT_SIZE, EXPORT_FORMATS, IMAGE_SIZES
+from post_generator import (
+    DEFAULT_SETTINGS, POST_TEMPLATES, PostRequest, build_post_request, cached_post, generate_post_async,
+    resolve_settings
+)
+from post_metrics import calculate_post_metrics, rank_posts
+from rate_limiter import RateLimitExceeded
+
+# Threads for the blocking steps of requests (cache reads, model builds, REST calls); asyncio's default is a handful
+API_THREADS = int(os.environ.get("POST_API_THREADS", "64"))
+MAX_BATCH_ITEMS = int(os.environ.get("POST_API_MAX_BATCH", "100"))
+# Generations a batch request runs at once unless it asks for fewer
+BATCH_CONCURRENCY = 8
+MAX_BATCH_CONCURRENCY = 32
+MAX_VARIANTS = 4
+DEFAULT_TEMPLATE = "Industry Insight"
+
+class InvalidRequest(ValueError):
+    """A request body the API cannot act on; answered with 400"""
+
+class MissingApiKey(InvalidRequest):
+    """No key in the request or the environment; answered with 401"""
+
+@dataclass(frozen=True)
+class ImageSpec:
+    size: Tuple[int, int] = DEFAULT_SIZE
+    export_format: str = "PNG"
+    quality: int = DEFAULT_QUALITY
+
+@dataclass(frozen=True)
+class PostJob:
+    request: PostRequest
+    use_cache: bool = True
+    image: Optional[ImageSpec] = None
+
+def _int_between(value: Any, low: int, high: int) -> bool:
+    # JSON true/false arrive as bool, which is an int subclass
+    return isinstance(value, int) and not isinstance(value, bool) and low <= value <= high
+
+def _parse_image(value: Any) -> ImageSpec:
+    if value is True:
+        return ImageSpec()
+    if not isinstance(value, dict):
+        raise InvalidRequest("'image' must be true or an object")
+    size = value.get('size', DEFAULT_SIZE)
+    if isinstance(size, str):
+        if size not in IMAGE_SIZES:
+            raise InvalidRequest(f"Unknown image size '{size}' (expected one of: {', '.join(IMAGE_SIZES)})")
+        size = IMAGE_SIZES[size]
+    elif not (isinstance(size, (list, tuple)) and len(size) == 2 and all(_int_between(n, 100, 4096) for n in size)):
+        raise InvalidRequest("'size' must be a size name or [width, height] between 100 and 4096")
+    export_format = value.get('format', "PNG")
+    if export_format not in EXPORT_FORMATS:
+        raise InvalidRequest(f"Unknown format '{export_format}' (expected one of: {', '.join(EXPORT_FORMATS)})")
+    quality = value.get('quality', DEFAULT_QUALITY)
+    if not _int_between(quality, 1, 100):
+        raise InvalidRequest("'quality' must be an integer from 1 to 100")
+    return ImageSpec(tuple(size), export_format, quality)
+
+def parse_post_job(body: Any) -> PostJob:
+    """Validate a post request body and build its prompts"""
+    if not isinstance(body, dict):
+        raise InvalidRequest("Expected a JSON object")
+    template_name = body.get('template') or DEFAULT_TEMPLATE
+    if template_name not in POST_TEMPLATES:
+        raise InvalidRequest(f"Unknown template '{template_name}' (expected one of: {', '.join(POST_TEMPLATES)})")
+    user_input = body.get('input')
+    if not isinstance(user_input, str) or not user_input.strip():
+        raise InvalidRequest("'input' must be a non-empty string")
+    settings = body.get('settings') or {}
+    if not isinstance(settings, dict):
+        raise InvalidRequest("'settings' must be an object")
+    unknown = set(settings) - set(DEFAULT_SETTINGS)
+    if unknown:
+        raise InvalidRequest(f"Unknown settings: {', '.join(sorted(unknown))}")
+    for key, value in settings.items():
+        expected = type(DEFAULT_SETTINGS[key])
+        if not isinstance(value, expected):
+            kind = "true or false" if expected is bool else "a string"
+            raise InvalidRequest(f"Setting '{key}' must be {kind}")
+    variants = body.get('variants', 1)
+    if not _int_between(variants, 1, MAX_VARIANTS):
+        raise InvalidRequest(f"'variants' must be an integer from 1 to {MAX_VARIANTS}")
+    use_cache = body.get('use_cache', True)
+    if not isinstance(use_cache, bool):
+        raise InvalidRequest("'use_cache' must be true or false")
+    image = _parse_image(body['image']) if body.get('image') else None
+    request = build_post_request(POST_TEMPLATES[template_name], user_input, resolve_settings(settings), variants)
+    return PostJob(request, use_cache, image)
+
+def error_payload(exc: Exception) -> Tuple[int, Dict]:
+    """HTTP status and JSON body for a failed request"""
+    if isinstance(exc, MissingApiKey):
+        return 401, {'error': str(exc)}
+    if isinstance(exc, InvalidRequest):
+        return 400, {'error': str(exc)}
+    if isinstance(exc, RateLimitExceeded):
+        return 429, {'error': str(exc), 'retry_after_seconds': math.ceil(exc.wait_seconds)}
+    # Everything else failed on the Gemini side (after retries) or while scoring and rendering
+    return 502, {'error': str(exc) or type(exc).__name__}
+
+def _error_response(exc: Exception) -> JSONResponse:
+    status, payload = error_payload(exc)
+    headers = {'Retry-After': str(payload['retry_after_seconds'])} if 'retry_after_seconds' in payload else None
+    return JSONResponse(payload, status_code=status, headers=headers)
+
+async def render_image(text: str, template: str, spec: ImageSpec) -> Tuple[str, bytes]:
+    """Render and encode a post image on the export process pool; returns its file name and bytes"""
+    # Pillow loads with the first image, as in the Streamlit pages
+    from image_export import start_export
+    job = start_export(text, template, [spec.size], [spec.export_format], spec.quality)
+    filename, future = next(iter(job.futures.items()))
+    try:
+        await asyncio.wait([asyncio.wrap_future(future)])
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    if future.cancelled():
+        # Cancelled when a broken shared pool was replaced, not by this request
+        raise RuntimeError("Image export was cancelled; please retry")
+    return filename, future.result()
+
+def _media_type(export_format: str) -> str:
+    return f"image/{EXPORT_FORMATS[export_format]['format'].lower()}"
+
+async def run_post_job(api_key: str, job: PostJob, stream: bool = False,
+                       on_chunk: Optional[Callable[[str], None]] = None) -> Dict:
+    """Generate (or fetch from the cache), score and optionally render one post"""
+    request = job.request
+    stats = CallStats()
+    result = await asyncio.to_thread(cached_post, request) if job.use_cache else None
+    cached = result is not None
+    if cached:
+        if on_chunk is not None and request.variant_count == 1:
+            on_chunk(result)
+    else:
+        result = await generate_post_async(api_key, request, stream=stream, stats=stats, on_chunk=on_chunk)
+
+    payload: Dict[str, Any] = {'template': request.template}
+    if request.variant_count > 1:
+        ranked = rank_posts(result)
+        payload['content'], metrics = ranked[0]
+        payload['variants'] = [{'content': text, 'metrics': asdict(variant_metrics)}
+                               for text, variant_metrics in ranked]
+    else:
+        payload['content'], metrics = result, calculate_post_metrics(result)
+    payload['metrics'] = asdict(metrics)
+    payload['cached'] = cached
+    payload['attempts'] = stats.attempts
+    payload['elapsed_seconds'] = round(stats.elapsed, 3)
+    if job.image is not None:
+        filename, data = await render_image(payload['content'], request.template, job.image)
+        payload['image'] = {'filename': filename, 'media_type': _media_type(job.image.export_format),
+                            'data': base64.b64encode(data).decode('ascii')}
+    return payload
+
+def _api_key(request: Request) -> str:
+    api_key = request.headers.get('x-goog-api-key') or os.environ.get("GEMINI_API_KEY")
+    if not api_key:
+        raise MissingApiKey("Missing API key: send an X-Goog-Api-Key header")
+    return api_key
+
+async def _json_body(request: Request) -> Any:
+    try:
+        return await request.json()
+    except ValueError:
+        raise InvalidRequest("Request body is not valid JSON")
+
+async def create_post(request: Request) -> Response:
+    try:
+        job = parse_post_job(await _json_body(request))
+        return JSONResponse(await run_post_job(_api_key(request), job))
+    except Exception as e:
+        return _error_response(e)
+
+async def create_batch(request: Request) -> Response:
+    try:
+        api_key = _api_key(request)
+        body = await _json_body(request)
+        items = body.get('items') if isinstance(body, dict) else None
+        if not isinstance(items, list) or not items:
+            raise InvalidRequest("'items' must be a non-empty list of post requests")
+        if len(items) > MAX_BATCH_ITEMS:
+            raise InvalidRequest(f"At most {MAX_BATCH_ITEMS} items per batch")
+        concurrency = body.get('concurrency', BATCH_CONCURRENCY)
+        if not _int_between(concurrency, 1, MAX_BATCH_CONCURRENCY):
+            raise InvalidRequest(f"'concurrency' must be an integer from 1 to {MAX_BATCH_CONCURRENCY}")
+        jobs = []
+        for index, item in enumerate(items):
+            try:
+                jobs.append(parse_post_job(item))
+            except InvalidRequest as e:
+                raise InvalidRequest(f"items[{index}]: {e}")
+    except Exception as e:
+        return _error_response(e)
+
+    # Items fail on their own; the rest of the batch still completes
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(index: int, job: PostJob) -> Dict:
+        async with semaphore:
+            try:
+                return {'index': index, **await run_post_job(api_key, job)}
+            except Exception as e:
+                status, payload = error_payload(e)
+                return {'index': index, 'status': status, **payload}
+
+    results: List[Dict] = await asyncio.gather(*(run(index, job) for index, job in enumerate(jobs)))
+    return JSONResponse({'results': results, 'failed': sum('error' in result for result in results)})
+
+async def stream_post(request: Request) -> Response:
+    try:
+        job = parse_post_job(await _json_body(request))
+        if job.request.variant_count > 1:
+            raise InvalidRequest("Variants are ranked once complete; request them from /v1/posts")
+        api_key = _api_key(request)
+    except Exception as e:
+        return _error_response(e)
+
+    async def lines() -> AsyncIterator[str]:
+        chunks: asyncio.Queue = asyncio.Queue()
+        task = asyncio.create_task(run_post_job(api_key, job, stream=True, on_chunk=chunks.put_nowait))
+        task.add_done_callback(lambda _: chunks.put_nowait(None))
+        try:
+            while True:
+                chunk = await chunks.get()
+                if chunk is None:
+                    break
+                yield json.dumps({'chunk': chunk}, ensure_ascii=False) + "\n"
+            try:
+                payload = task.result()
+            except Exception as e:
+                status, payload = error_payload(e)
+                payload['status'] = status
+            yield json.dumps({'done': True, **payload}, ensure_ascii=False) + "\n"
+        finally:
+            # The client went away mid-stream: stop the generation instead of finishing it unread
+            task.cancel()
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+async def post_metrics(request: Request) -> Response:
+    try:
+        body = await _json_body(request)
+        text = body.get('text') if isinstance(body, dict) else None
+        if not isinstance(text, str) or not text.strip():
+            raise InvalidRequest("'text' must be a non-empty string")
+    except Exception as e:
+        return _error_response(e)
+    return JSONResponse(asdict(calculate_post_metrics(text)))
+
+async def post_image(request: Request) -> Response:
+    try:
+        body = await _json_body(request)
+        if not isinstance(body, dict):
+            raise InvalidRequest("Expected a JSON object")
+        text = body.get('text')
+        if not isinstance(text, str) or not text.strip():
+            raise InvalidRequest("'text' must be a non-empty string")
+        template = body.get('template') or DEFAULT_TEMPLATE
+        spec = _parse_image({key: body[key] for key in ('size', 'format', 'quality') if key in body})
+        filename, data = await render_image(text, template, spec)
+    except Exception as e:
+        return _error_response(e)
+    return Response(data, media_type=_media_type(spec.export_format),
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
+async def list_templates(request: Request) -> Response:
+    return JSONResponse([asdict(template) for template in POST_TEMPLATES.values()])
+
+async def healthz(request: Request) -> Response:
+    return JSONResponse({'status': "ok"})
+
+@asynccontextmanager
+async def lifespan(app: Starlette) -> AsyncIterator[None]:
+    executor = ThreadPoolExecutor(max_workers=API_THREADS, thread_name_prefix="api")
+    asyncio.get_running_loop().set_default_executor(executor)
+    try:
+        yield
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+app = Starlette(
+    routes=[
+        Route("/v1/posts", create_post, methods=["POST"]),
+        Route("/v1/posts/batch", create_batch, methods=["POST"]),
+        Route("/v1/posts/stream", stream_post, methods=["POST"]),
+        Route("/v1/metrics", post_metrics, methods=["POST"]),
+        Route("/v1/images", post_image, methods=["POST"]),
+        Route("/v1/templates", list_templates, methods=["GET"]),
+        Route("/healthz", healthz, methods=["GET"]),
+    ],
+    lifespan=lifespan
+)
+
+def main() -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=1, help="server processes, each with its own rate limiter")
+    args = parser.parse_args()
+    uvicorn.run("api_server:app", host=args.host, port=args.port, workers=args.workers)
+
+if __name__ == "__main__":
+    main()
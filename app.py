@@ -1,18 +1,25 @@
 import streamlit as st
-import google.generativeai as genai
-import requests
-from PIL import Image, ImageDraw, ImageFont
-import io
-import base64
-import json
-import time
 import datetime
 import re
+import uuid
 from dataclasses import dataclass
-from typing import List, Dict
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
+from typing import List, Dict, Iterator
+# pandas/plotly (Analytics tab), Pillow (post images) and the Gemini SDK are imported where first used
+from response_cache import get_response_cache
+from batch import parse_batch_file, run_batch
+from rate_limiter import get_rate_limiter
+from post_metrics import calculate_post_metrics, rank_posts
+from history_store import get_history_store
+from image_options import DEFAULT_QUALITY, EXPORT_FORMATS, IMAGE_SIZES
+from pipeline import GenerationPipeline
+from prompts import MAX_INPUT_TOKENS, build_template_request, count_tokens, needs_exact_count, truncate_to_tokens
+from gemini_client import generate_content, get_model, stream_text
+from post_generator import (
+    POST_TEMPLATES, TEXT_MODEL, PostTemplate, build_post_request, cached_post, generate_content_with_template,
+    generate_post_async
+)
+from generation_service import CANCELLED, DONE, get_generation_service
+from tracing import get_tracer
 
 # Page configuration
 st.set_page_config(
@@ -181,200 +188,345 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# Data classes for better organization
-@dataclass
-class PostMetrics:
-    character_count: int
-    word_count: int
-    hashtag_count: int
-    engagement_score: float
-    readability_score: str
+# Browser cookie keeping an anonymous visitor's history owner id across sessions
+OWNER_COOKIE = "post_history_owner"
+OWNER_COOKIE_MAX_AGE = 365 * 24 * 60 * 60
 
-@dataclass
-class PostTemplate:
-    name: str
-    description: str
-    structure: str
-    example: str
-
-# Enhanced templates
-POST_TEMPLATES = {
-    "Industry Insight": PostTemplate(
-        name="Industry Insight",
-        description="Share professional insights and trends",
-        structure="Hook → Insight → Evidence → Call to Action",
-        example="🚀 The remote work revolution isn't slowing down...\n\nHere's what the latest data reveals about the future of work..."
-    ),
-    "Personal Story": PostTemplate(
-        name="Personal Story",
-        description="Share personal experiences and lessons",
-        structure="Story Setup → Challenge → Resolution → Lesson",
-        example="Yesterday, I made a mistake that taught me more than any success...\n\nHere's what happened and what I learned..."
-    ),
-    "Educational Content": PostTemplate(
-        name="Educational Content",
-        description="Teach something valuable to your audience",
-        structure="Problem → Solution Steps → Benefits → Resources",
-        example="Struggling with productivity? Here are 5 science-backed methods that actually work..."
-    ),
-    "Question/Poll": PostTemplate(
-        name="Question/Poll",
-        description="Engage audience with questions",
-        structure="Context → Question → Options → Engagement Ask",
-        example="I've been thinking about the future of AI in our industry...\n\nWhat's your biggest concern? 👇"
-    ),
-    "Achievement/Milestone": PostTemplate(
-        name="Achievement/Milestone",
-        description="Share wins and celebrate progress",
-        structure="Achievement → Journey → Gratitude → Future Goals",
-        example="🎉 Just hit a major milestone that seemed impossible 12 months ago...\n\nHere's how it happened..."
-    ),
-    "Controversial Take": PostTemplate(
-        name="Controversial Take",
-        description="Share bold opinions respectfully",
-        structure="Unpopular Opinion → Reasoning → Evidence → Discussion Invite",
-        example="Unpopular opinion: The 40-hour work week is dead, and here's why that's actually good news..."
-    )
-}
+def history_owner() -> str:
+    """Whose posts this session sees: the signed-in user, else a random id persisted in a browser cookie"""
+    if st.user.get("is_logged_in"):
+        return f"user:{st.user.get('sub') or st.user.get('email')}"
+    owner = st.context.cookies.get(OWNER_COOKIE)
+    # Anything but an id this app issued (or no cookies at all, outside a browser session) gets a new one
+    if not isinstance(owner, str) or not re.fullmatch(r"[0-9a-f]{32}", owner):
+        owner = uuid.uuid4().hex
+        # Streamlit cannot set cookies server-side; the browser stores it and sends it on later visits
+        st.html(
+            f"<script>document.cookie = '{OWNER_COOKIE}={owner}; max-age={OWNER_COOKIE_MAX_AGE}; "
+            "path=/; SameSite=Strict';</script>",
+            unsafe_allow_javascript=True
+        )
+    return f"browser:{owner}"
 
 # Initialize session state
 def init_session_state():
     if 'post_history' not in st.session_state:
-        st.session_state.post_history = []
+        # Each visitor only sees their own posts (unless POST_HISTORY_SHARED is set)
+        st.session_state.post_history = get_history_store().for_owner(history_owner())
     if 'generated_post' not in st.session_state:
         st.session_state.generated_post = ""
     if 'current_template' not in st.session_state:
         st.session_state.current_template = None
     if 'analytics_data' not in st.session_state:
-        st.session_state.analytics_data = []
+        # Built by get_analytics_table() when the Analytics tab is first opened
+        st.session_state.analytics_data = None
+    if 'post_variants' not in st.session_state:
+        st.session_state.post_variants = []
+        st.session_state.variant_source = None
+    if 'session_id' not in st.session_state:
+        st.session_state.session_id = uuid.uuid4().hex
+        st.session_state.pending_generation = None
+    if 'image_export' not in st.session_state:
+        st.session_state.image_export = None
+        st.session_state.image_preview = None
+    if 'history_page' not in st.session_state:
+        # Post History's page widget reads its value from here, so clamping it never conflicts with a default
+        st.session_state.history_page = 1
 
-def calculate_post_metrics(post_text: str) -> PostMetrics:
-    """Calculate comprehensive metrics for a post"""
-    char_count = len(post_text)
-    word_count = len(post_text.split())
-    hashtag_count = len(re.findall(r'#\w+', post_text))
-    
-    # Simple engagement score calculation
-    engagement_factors = {
-        'question_marks': post_text.count('?') * 2,
-        'exclamation_marks': post_text.count('!') * 1.5,
-        'emojis': len(re.findall(r'[\U0001F600-\U0001F64F]|[\U0001F300-\U0001F5FF]|[\U0001F680-\U0001F6FF]|[\U0001F1E0-\U0001F1FF]', post_text)) * 1.2,
-        'call_to_action': 3 if any(cta in post_text.lower() for cta in ['what do you think', 'comment below', 'share your', 'let me know']) else 0,
-        'optimal_length': 5 if 100 <= char_count <= 1300 else 0,
-        'hashtags': min(hashtag_count * 0.5, 4)  # Cap at 4 points for hashtags
-    }
-    
-    engagement_score = min(sum(engagement_factors.values()) / 2, 10)  # Scale to 10
-    
-    # Readability assessment
-    sentences = len(re.split(r'[.!?]+', post_text))
-    avg_words_per_sentence = word_count / max(sentences, 1)
-    
-    if avg_words_per_sentence <= 15:
-        readability = "Excellent"
-    elif avg_words_per_sentence <= 20:
-        readability = "Good"
-    elif avg_words_per_sentence <= 25:
-        readability = "Fair"
-    else:
-        readability = "Needs Improvement"
-    
-    return PostMetrics(
-        character_count=char_count,
-        word_count=word_count,
-        hashtag_count=hashtag_count,
-        engagement_score=engagement_score,
-        readability_score=readability
-    )
+def get_analytics_table():
+    """The session's analytics table, synced with the history store; pandas loads with the first call"""
+    from analytics import AnalyticsTable
+    if st.session_state.analytics_data is None:
+        st.session_state.analytics_data = AnalyticsTable()
+    # Pick up posts saved before a refresh, while the tab was closed or by other sessions
+    st.session_state.analytics_data.sync(st.session_state.post_history)
+    return st.session_state.analytics_data
+
+def add_to_history(post_data: dict) -> int:
+    """Record a generated post in the history store and the analytics table; returns its post id"""
+    post_id = st.session_state.post_history.add(post_data)
+    if st.session_state.analytics_data is not None:
+        st.session_state.analytics_data.append([dict(post_data, id=post_id)])
+    return post_id
+
+def update_history_content(post_data: dict, content: str):
+    """Replace the text of a post already in history (post_data carries its id)"""
+    st.session_state.post_history.update_content(post_data['id'], content)
+    if st.session_state.analytics_data is not None:
+        st.session_state.analytics_data.remove(post_data['id'])
+        st.session_state.analytics_data.append([dict(post_data, content=content)])
+
+def start_generation(api_key: str, template: PostTemplate, user_input: str, settings: dict, variant_count: int = 1,
+                     stream: bool = True, use_cache: bool = True):
+    """Cached result for a generation, or (None, request) submitted to the generation service
 
-def generate_content_with_template(api_key: str, template: PostTemplate, user_input: str, settings: dict) -> str:
-    """Generate content using selected template and user input"""
-    genai.configure(api_key=api_key)
-    
-    prompt = f"""
-    Create a LinkedIn post using the "{template.name}" template structure: {template.structure}
-    
-    User Input: {user_input}
-    
-    Settings:
-    - Tone: {settings['tone']}
-    - Length: {settings['length']}
-    - Industry Focus: {settings.get('industry', 'General')}
-    - Target Audience: {settings.get('audience', 'LinkedIn professionals')}
-    
-    Requirements:
-    - Follow the template structure closely
-    - Make it highly engaging and valuable
-    - Use appropriate emojis strategically (2-4 total)
-    - Use line breaks for readability
-    - Write in a conversational yet professional tone
-    {'- Include 5-8 relevant hashtags at the end' if settings['hashtags'] else '- No hashtags'}
-    {'- Include a clear call-to-action' if settings['cta'] else '- No call-to-action needed'}
-    
-    Make it authentic and compelling for LinkedIn's professional audience.
+    user_input must already be truncated (the Create tab does that with the model's exact token count).
     """
+    post_request = build_post_request(template, user_input, settings, variant_count, max_input_tokens=None)
+    if use_cache:
+        cached = cached_post(post_request)
+        if cached is not None:
+            return cached, None
     
-    model = genai.GenerativeModel('gemini-1.5-flash')
-    response = model.generate_content(prompt)
-    return response.text
+    async def job(request):
+        return await generate_post_async(api_key, post_request, stream=stream, stats=request.stats,
+                                         on_chunk=request.chunks.append)
+    
+    # A new request from this session supersedes (cancels) one still running; a repeat click joins it
+    request = get_generation_service().submit(
+        st.session_state.session_id, job,
+        key=f"{post_request.cache_model}\x00{post_request.cache_prompt}\x00{stream}"
+    )
+    return None, request
 
-def create_post_image(text: str, template_style: str = "professional") -> Image.Image:
-    """Create a simple branded image for the post"""
-    # Create a simple branded image
-    img = Image.new('RGB', (1200, 630), color='#f8f9fa')
-    draw = ImageDraw.Draw(img)
-    
-    # Try to load a font, fallback to default
-    try:
-        title_font = ImageFont.truetype("arial.ttf", 36)
-        subtitle_font = ImageFont.truetype("arial.ttf", 24)
-    except:
-        title_font = ImageFont.load_default()
-        subtitle_font = ImageFont.load_default()
-    
-    # Add LinkedIn brand colors gradient effect
-    for i in range(630):
-        color_ratio = i / 630
-        r = int(0 + (248-0) * color_ratio)
-        g = int(119 + (249-119) * color_ratio)
-        b = int(181 + (250-181) * color_ratio)
-        draw.line([(0, i), (1200, i)], fill=(r, g, b))
-    
-    # Add text
-    title = "LinkedIn Post"
-    subtitle = "Generated with AI"
-    
-    # Calculate text positions
-    title_bbox = draw.textbbox((0, 0), title, font=title_font)
-    title_width = title_bbox[2] - title_bbox[0]
-    title_x = (1200 - title_width) // 2
-    
-    subtitle_bbox = draw.textbbox((0, 0), subtitle, font=subtitle_font)
-    subtitle_width = subtitle_bbox[2] - subtitle_bbox[0]
-    subtitle_x = (1200 - subtitle_width) // 2
-    
-    # Draw text with shadow effect
-    draw.text((title_x+2, 282), title, font=title_font, fill='#333333')
-    draw.text((title_x, 280), title, font=title_font, fill='white')
-    
-    draw.text((subtitle_x+2, 332), subtitle, font=subtitle_font, fill='#666666')
-    draw.text((subtitle_x, 330), subtitle, font=subtitle_font, fill='white')
-    
-    return img
+@st.fragment(run_every=0.5)
+def generation_progress(request_id: str):
+    """Show a running generation's streamed text until it finishes"""
+    service = get_generation_service()
+    request = service.get(request_id)
+    if request is None or request.done:
+        st.rerun()
+    if request.chunks:
+        st.markdown(request.partial_text + "▌")
+    else:
+        st.info("🤖 AI is crafting your perfect LinkedIn post...")
+    if st.button("⏹️ Cancel", key=f"cancel_{request_id}"):
+        service.cancel(request_id)
+        st.rerun()
 
-# Main application
-def main():
-    init_session_state()
+def finish_generation(pending: dict, request) -> None:
+    """Rank, score, render and save a finished generation, then report how it went"""
+    if request is not None and request.state != DONE:
+        if request.state == CANCELLED:
+            st.info("⏹️ Generation cancelled.")
+        else:
+            st.error(f"❌ Error generating post: {request.error}")
+            st.info("💡 Please check your API key and try again.")
+        return
+    
+    result = pending['cached'] if request is None else request.result
+    pipeline = GenerationPipeline(start=request.created if request is not None else None)
+    if request is not None:
+        pipeline.record_stage("text", request.started, request.finished)
+    
+    if pending['variant_count'] > 1:
+        # The best-ranked variant becomes the post; the image needs it, so ranking comes first
+        ranked = pipeline.submit("metrics", rank_posts, result).result()
+        generated_content = ranked[0][0]
+        st.session_state.post_variants = ranked
+    else:
+        generated_content = result
+        # Metrics and the image card only need the text, so they run side by side
+        pipeline.submit("metrics", calculate_post_metrics, generated_content)
+        st.session_state.post_variants = []
+    set_generated_post(generated_content)
+    
+    if pending['image_size'] is not None:
+        from post_image import create_post_image
+        pipeline.submit("image", create_post_image, generated_content, pending['template'], pending['image_size'])
+    
+    # Add to history
+    post_data = {
+        'timestamp': datetime.datetime.now(),
+        'template': pending['template'],
+        'content': generated_content,
+        'settings': pending['settings'],
+        'input': pending['input']
+    }
+    with pipeline.stage("save"):
+        # The store reads the metrics the metrics stage just cached
+        pipeline.result("metrics")
+        post_id = add_to_history(post_data)
+    # Picking another variant later rewrites this history entry rather than adding one
+    st.session_state.variant_source = dict(post_data, id=post_id)
+    
+    if pending['image_size'] is not None:
+        try:
+            st.session_state.image_preview = pipeline.result("image")
+        except Exception as e:
+            st.warning(f"Image generation failed: {str(e)}")
     
-    # Header with enhanced styling
     st.markdown("""
-    <div class="main-header">
-        <h1>🚀 LinkedIn Post Generator Pro</h1>
-        <p>AI-Powered Content Creation with Advanced Analytics & Templates</p>
+    <div class="success-message">
+        ✅ <strong>Post Generated Successfully!</strong><br>
+        Your LinkedIn post is ready for review and editing.
     </div>
     """, unsafe_allow_html=True)
+    if request is not None:
+        st.caption(f"⏱️ Gemini call: {request.stats.summary()}")
+    else:
+        st.caption("⚡ Served from cache")
+    st.caption(f"🧩 Pipeline: {pipeline.summary()}")
+    with st.expander("⏱️ Stage Timings"):
+        st.dataframe(pipeline.timing_rows(), hide_index=True, width="stretch")
+
+def render_stream(chunks: Iterator[str], placeholder) -> str:
+    """Render streamed chunks into a placeholder and return the full text"""
+    text = ""
+    for chunk in chunks:
+        text += chunk
+        placeholder.markdown(text + "▌")
+    placeholder.empty()
+    return text
+
+def set_generated_post(text: str):
+    """Make text the current post and reset the editor so it shows the new content"""
+    st.session_state.generated_post = text
+    st.session_state.pop("post_editor", None)
+    # Images rendered for the previous text are stale
+    if st.session_state.image_export is not None:
+        st.session_state.image_export.cancel()
+    st.session_state.image_export = None
+    st.session_state.image_preview = None
+
+@st.fragment(run_every=0.5)
+def image_export_progress():
+    """Poll the running image export without rerunning the whole script"""
+    export_job = st.session_state.image_export
+    if export_job is None or export_job.done():
+        # Full rerun so the download button renders outside this polling fragment
+        st.rerun()
+    total = len(export_job.futures)
+    st.progress(export_job.completed / total, text=f"Exporting images... {export_job.completed}/{total}")
+
+@st.fragment
+def render_analytics():
+    """Analytics tab; runs only while the tab is open, so plotly and pandas load on first visit"""
+    import plotly.express as px
     
-    # Sidebar configuration
+    st.header("📊 Advanced Analytics Dashboard")
+    
+    analytics_df = get_analytics_table().frame
+    if not analytics_df.empty:
+        # Overview metrics
+        col1, col2, col3, col4 = st.columns(4)
+        
+        with col1:
+            st.markdown(f"""
+            <div class="metric-card">
+                <div class="metric-value">{len(analytics_df)}</div>
+                <div class="metric-label">Posts Created</div>
+            </div>
+            """, unsafe_allow_html=True)
+        
+        with col2:
+            avg_engagement = analytics_df['Engagement_Score'].mean()
+            st.markdown(f"""
+            <div class="metric-card">
+                <div class="metric-value">{avg_engagement:.1f}/10</div>
+                <div class="metric-label">Avg Engagement</div>
+            </div>
+            """, unsafe_allow_html=True)
+        
+        with col3:
+            most_used_template = analytics_df['Template'].mode()[0] if not analytics_df.empty else "N/A"
+            st.markdown(f"""
+            <div class="metric-card">
+                <div class="metric-value">{most_used_template}</div>
+                <div class="metric-label">Top Template</div>
+            </div>
+            """, unsafe_allow_html=True)
+        
+        with col4:
+            avg_words = analytics_df['Words'].mean() if not analytics_df.empty else 0
+            st.markdown(f"""
+            <div class="metric-card">
+                <div class="metric-value">{int(avg_words)}</div>
+                <div class="metric-label">Avg Words</div>
+            </div>
+            """, unsafe_allow_html=True)
+        
+        st.divider()
+        
+        # Charts section
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            st.subheader("Engagement Over Time")
+            if not analytics_df.empty:
+                fig = px.line(
+                    analytics_df, 
+                    x='Date', 
+                    y='Engagement_Score',
+                    markers=True,
+                    labels={'Engagement_Score': 'Engagement Score'},
+                    color_discrete_sequence=['#0077b5']
+                )
+                fig.update_layout(
+                    xaxis_title='Date',
+                    yaxis_title='Score (0-10)',
+                    yaxis_range=[0,10],
+                    plot_bgcolor='rgba(0,0,0,0)',
+                    paper_bgcolor='rgba(0,0,0,0)'
+                )
+                st.plotly_chart(fig, width="stretch")
+            else:
+                st.info("No analytics data yet")
+        
+        with col2:
+            st.subheader("Template Performance")
+            if not analytics_df.empty:
+                template_df = analytics_df.groupby('Template')['Engagement_Score'].mean().reset_index()
+                fig = px.bar(
+                    template_df,
+                    x='Template',
+                    y='Engagement_Score',
+                    labels={'Engagement_Score': 'Avg Engagement Score'},
+                    color='Engagement_Score',
+                    color_continuous_scale='Blues'
+                )
+                fig.update_layout(
+                    xaxis_title='Template',
+                    yaxis_title='Avg Score',
+                    yaxis_range=[0,10],
+                    plot_bgcolor='rgba(0,0,0,0)',
+                    paper_bgcolor='rgba(0,0,0,0)'
+                )
+                st.plotly_chart(fig, width="stretch")
+            else:
+                st.info("No template data yet")
+        
+        st.divider()
+        
+        # Detailed metrics
+        st.subheader("Detailed Post Metrics")
+        if not analytics_df.empty:
+            # Display dataframe with formatting
+            st.dataframe(
+                analytics_df[['Date', 'Template', 'Words', 'Hashtags', 
+                            'Engagement_Score', 'Readability']]
+                .sort_values('Date', ascending=False)
+                .rename(columns={
+                    'Date': 'Date',
+                    'Template': 'Template',
+                    'Words': 'Words',
+                    'Hashtags': 'Hashtags',
+                    'Engagement_Score': 'Engagement',
+                    'Readability': 'Readability'
+                }),
+                width="stretch"
+            )
+        else:
+            st.info("Generate more posts to see detailed metrics")
+    else:
+        st.info("📝 Generate your first post to see analytics")
+
+@dataclass
+class CreateOptions:
+    """Sidebar choices the Create and Batch tabs depend on; fragments receive them as arguments"""
+    template_name: str
+    settings: Dict
+    generate_image: bool
+    image_size_names: List[str]
+    export_formats: List[str]
+    export_quality: int
+    stream_output: bool
+    variant_count: int
+    show_analytics: bool
+    use_cache: bool
+
+def render_sidebar():
+    """Sidebar configuration: the API key and the options every tab reads"""
     with st.sidebar:
         st.header("🔧 Configuration")
         
@@ -460,549 +612,715 @@ def main():
         include_cta = st.checkbox("Include Call-to-Action", value=True)
         include_emojis = st.checkbox("Include Emojis", value=True)
         generate_image = st.checkbox("Generate Post Image", value=False)
+        image_size_names, export_formats, export_quality = [], [], DEFAULT_QUALITY
+        if generate_image:
+            image_size_names = st.multiselect(
+                "Image Sizes", list(IMAGE_SIZES.keys()), default=[list(IMAGE_SIZES.keys())[0]],
+                help="The first size is previewed; every selected size is exported"
+            )
+            export_formats = st.multiselect("Export Formats", list(EXPORT_FORMATS.keys()), default=["PNG"])
+            export_quality = st.slider("JPEG/WebP Quality", 50, 100, DEFAULT_QUALITY, 5)
+        stream_output = st.checkbox("Stream Output", value=True, help="Show the post as it is being written")
+        variant_count = st.slider(
+            "Variants", min_value=1, max_value=4, value=1,
+            help="Generate several candidates in one request and rank them by engagement and readability"
+        )
         
         # Analytics toggle
         show_analytics = st.checkbox("Show Advanced Analytics", value=True)
+        
+        # Response cache
+        use_cache = st.checkbox(
+            "Reuse Cached Responses", 
+            value=True,
+            help="Identical requests are answered from a local cache. Turn off to force a fresh generation."
+        )
+        
+        # Quick stats
+        st.subheader("📊 Quick Stats")
+        cache_stats = get_response_cache().stats()
+        st.caption(
+            f"⚡ Cache: {cache_stats.hits} hits / {cache_stats.misses} misses "
+            f"({cache_stats.entries} entries, {cache_stats.size_bytes / 1024:.0f} KB)"
+        )
+        if api_key:
+            quota = get_rate_limiter(api_key).status()
+            st.caption(
+                f"🔋 Remaining quota: {quota.requests_minute}/min · {quota.requests_day}/day · "
+                f"{quota.tokens_minute:,} tokens/min"
+            )
+    
+    options = CreateOptions(
+        template_name=template_name,
+        settings={
+            'tone': post_tone,
+            'length': post_length,
+            'industry': industry,
+            'audience': target_audience,
+            'hashtags': include_hashtags,
+            'cta': include_cta,
+            'emojis': include_emojis
+        },
+        generate_image=generate_image,
+        image_size_names=image_size_names,
+        export_formats=export_formats,
+        export_quality=export_quality,
+        stream_output=stream_output,
+        variant_count=variant_count,
+        show_analytics=show_analytics,
+        use_cache=use_cache
+    )
+    return api_key, options
 
-    # Main content area
-    if api_key:
-        # Create tabs for different sections
-        tab1, tab2, tab3, tab4 = st.tabs(["✍️ Create Post", "📊 Analytics", "📚 Post History", "🎓 Learning Hub"])
+@st.fragment
+def post_editor_panel(show_metrics: bool, include_hashtags: bool):
+    """Post editor with its live metrics; editing reruns only this fragment"""
+    # Post preview with metrics
+    col1, col2 = st.columns([3, 1])
+    
+    with col1:
+        st.header("📝 Generated Post")
         
-        with tab1:
-            # Post creation interface
-            st.header("💡 Create Your LinkedIn Post")
+        # Post container with enhanced styling
+        st.markdown('<div class="post-container">', unsafe_allow_html=True)
+        
+        # Editable post content
+        edited_post = st.text_area(
+            "Edit your post:",
+            value=st.session_state.generated_post,
+            height=300,
+            key="post_editor"
+        )
+        
+        st.markdown('</div>', unsafe_allow_html=True)
+        st.download_button(
+            label="💾 Download",
+            data=edited_post,
+            file_name=f"linkedin_post_{datetime.datetime.now().strftime('%Y%m%d_%H%M')}.txt",
+            mime="text/plain"
+        )
+    
+    with col2:
+        if show_metrics:
+            st.header("📊 Post Metrics")
+            metrics = calculate_post_metrics(edited_post)
             
-            # Input method selection
-            input_method = st.radio(
-                "Choose your input method:",
-                ["💭 Topic/Idea", "📝 Key Points", "📰 Article/News", "🎯 Custom Prompt"],
-                horizontal=True
-            )
+            # Metrics display
+            st.markdown(f"""
+            <div class="metric-card">
+                <div class="metric-value">{metrics.character_count}</div>
+                <div class="metric-label">Characters</div>
+            </div>
+            """, unsafe_allow_html=True)
             
-            user_input = ""
+            st.markdown(f"""
+            <div class="metric-card">
+                <div class="metric-value">{metrics.word_count}</div>
+                <div class="metric-label">Words</div>
+            </div>
+            """, unsafe_allow_html=True)
             
-            if input_method == "💭 Topic/Idea":
-                col1, col2 = st.columns([2, 1])
-                with col1:
-                    topic = st.text_input(
-                        "Enter your topic or main idea:",
-                        placeholder="e.g., Remote work productivity, AI in healthcare, Career pivot strategies..."
-                    )
-                with col2:
-                    quick_topics = st.selectbox(
-                        "Quick Topics",
-                        ["", "Career Growth", "Leadership", "Innovation", "Work-Life Balance", 
-                         "Team Management", "Digital Transformation", "Networking"]
-                    )
-                    if quick_topics:
-                        topic = quick_topics
-                
-                additional_context = st.text_area(
-                    "Additional context or your unique perspective:",
-                    placeholder="Share your personal experience, insights, or specific angle on this topic..."
-                )
-                user_input = f"Topic: {topic}\nContext: {additional_context}"
-                
-            elif input_method == "📝 Key Points":
-                key_points = st.text_area(
-                    "Enter key points (one per line):",
-                    placeholder="• First key insight or takeaway\n• Second important point\n• Supporting evidence or example\n• Conclusion or action item",
-                    height=150
-                )
-                user_input = f"Key points to cover:\n{key_points}"
-                
-            elif input_method == "📰 Article/News":
-                col1, col2 = st.columns([2, 1])
-                with col1:
-                    article_url = st.text_input("Article URL (optional):")
-                with col2:
-                    article_type = st.selectbox("Content Type", ["Article", "News", "Research", "Report", "Blog Post"])
-                
-                article_summary = st.text_area(
-                    f"{article_type} summary or key insights:",
-                    placeholder="Summarize the main points and share your perspective on what this means for your industry...",
-                    height=120
-                )
-                user_input = f"{article_type} insights: {article_summary}"
-                if article_url:
-                    user_input += f"\nSource: {article_url}"
-                    
-            else:  # Custom Prompt
-                custom_prompt = st.text_area(
-                    "Enter your custom prompt:",
-                    placeholder="Write a detailed prompt describing exactly what kind of post you want to create...",
-                    height=120
-                )
-                user_input = custom_prompt
+            st.markdown(f"""
+            <div class="metric-card">
+                <div class="metric-value">{metrics.hashtag_count}</div>
+                <div class="metric-label">Hashtags</div>
+            </div>
+            """, unsafe_allow_html=True)
             
-            # Settings summary
-            settings = {
-                'tone': post_tone,
-                'length': post_length,
-                'industry': industry,
-                'audience': target_audience,
-                'hashtags': include_hashtags,
-                'cta': include_cta,
-                'emojis': include_emojis
-            }
+            # Engagement score
+            score_color = "#28a745" if metrics.engagement_score >= 7 else "#ffc107" if metrics.engagement_score >= 4 else "#dc3545"
+            st.markdown(f"""
+            <div class="engagement-score" style="background: {score_color};">
+                Engagement Score: {metrics.engagement_score:.1f}/10
+            </div>
+            """, unsafe_allow_html=True)
             
-            # Generate button with enhanced styling
-            col1, col2, col3 = st.columns([1, 2, 1])
-            with col2:
-                if st.button("🚀 Generate LinkedIn Post", key="generate_btn", use_container_width=True):
-                    if user_input.strip():
-                        with st.spinner("🤖 AI is crafting your perfect LinkedIn post..."):
-                            try:
-                                generated_content = generate_content_with_template(
-                                    api_key, selected_template, user_input, settings
-                                )
-                                st.session_state.generated_post = generated_content
-                                
-                                # Add to history
-                                post_data = {
-                                    'timestamp': datetime.datetime.now(),
-                                    'template': template_name,
-                                    'content': generated_content,
-                                    'settings': settings,
-                                    'input': user_input
-                                }
-                                st.session_state.post_history.append(post_data)
-                                
-                                st.markdown("""
-                                <div class="success-message">
-                                    ✅ <strong>Post Generated Successfully!</strong><br>
-                                    Your LinkedIn post is ready for review and editing.
-                                </div>
-                                """, unsafe_allow_html=True)
-                                
-                            except Exception as e:
-                                st.error(f"❌ Error generating post: {str(e)}")
-                                st.info("💡 Please check your API key and try again.")
-                    else:
-                        st.warning("⚠️ Please provide input for your post.")
+            st.write(f"**Readability:** {metrics.readability_score}")
             
-            # Display generated content
-            if st.session_state.generated_post:
-                st.divider()
-                
-                # Post preview with metrics
-                col1, col2 = st.columns([3, 1])
+            # Recommendations
+            with st.expander("💡 Optimization Tips"):
+                recommendations = []
+                if metrics.character_count > 1300:
+                    recommendations.append("Consider shortening for better engagement")
+                if metrics.hashtag_count == 0 and include_hashtags:
+                    recommendations.append("Add hashtags to increase discoverability")
+                if metrics.engagement_score < 5:
+                    recommendations.append("Add questions or call-to-actions to boost engagement")
+                if '?' not in edited_post:
+                    recommendations.append("Consider adding a question to encourage comments")
                 
-                with col1:
-                    st.header("📝 Generated Post")
-                    
-                    # Post container with enhanced styling
-                    st.markdown('<div class="post-container">', unsafe_allow_html=True)
-                    
-                    # Editable post content
-                    edited_post = st.text_area(
-                        "Edit your post:",
-                        value=st.session_state.generated_post,
-                        height=300,
-                        key="post_editor"
+                for rec in recommendations:
+                    st.write(f"• {rec}")
+
+@st.fragment
+def render_create_tab(api_key: str, options: CreateOptions):
+    """Create tab: input, generation and the generated post's editor and actions"""
+    selected_template = POST_TEMPLATES[options.template_name]
+    settings = options.settings
+    
+    # Post creation interface
+    st.header("💡 Create Your LinkedIn Post")
+    
+    # Input method selection
+    input_method = st.radio(
+        "Choose your input method:",
+        ["💭 Topic/Idea", "📝 Key Points", "📰 Article/News", "🎯 Custom Prompt"],
+        horizontal=True
+    )
+    
+    user_input = ""
+    
+    if input_method == "💭 Topic/Idea":
+        col1, col2 = st.columns([2, 1])
+        with col1:
+            topic = st.text_input(
+                "Enter your topic or main idea:",
+                placeholder="e.g., Remote work productivity, AI in healthcare, Career pivot strategies..."
+            )
+        with col2:
+            quick_topics = st.selectbox(
+                "Quick Topics",
+                ["", "Career Growth", "Leadership", "Innovation", "Work-Life Balance", 
+                 "Team Management", "Digital Transformation", "Networking"]
+            )
+            if quick_topics:
+                topic = quick_topics
+        
+        additional_context = st.text_area(
+            "Additional context or your unique perspective:",
+            placeholder="Share your personal experience, insights, or specific angle on this topic..."
+        )
+        user_input = f"Topic: {topic}\nContext: {additional_context}"
+    
+    elif input_method == "📝 Key Points":
+        key_points = st.text_area(
+            "Enter key points (one per line):",
+            placeholder="• First key insight or takeaway\n• Second important point\n• Supporting evidence or example\n• Conclusion or action item",
+            height=150
+        )
+        user_input = f"Key points to cover:\n{key_points}"
+    
+    elif input_method == "📰 Article/News":
+        col1, col2 = st.columns([2, 1])
+        with col1:
+            article_url = st.text_input("Article URL (optional):")
+        with col2:
+            article_type = st.selectbox("Content Type", ["Article", "News", "Research", "Report", "Blog Post"])
+        
+        article_summary = st.text_area(
+            f"{article_type} summary or key insights:",
+            placeholder="Summarize the main points and share your perspective on what this means for your industry...",
+            height=120
+        )
+        user_input = f"{article_type} insights: {article_summary}"
+        if article_url:
+            user_input += f"\nSource: {article_url}"
+    
+    else:  # Custom Prompt
+        custom_prompt = st.text_area(
+            "Enter your custom prompt:",
+            placeholder="Write a detailed prompt describing exactly what kind of post you want to create...",
+            height=120
+        )
+        user_input = custom_prompt
+    
+    # Long input (e.g. pasted articles) is cut before it is sent; near the limit the API count decides
+    user_input, input_truncated = truncate_to_tokens(
+        user_input, MAX_INPUT_TOKENS,
+        model=get_model(api_key, TEXT_MODEL) if needs_exact_count(user_input, MAX_INPUT_TOKENS) else None
+    )
+    if input_truncated:
+        st.warning(f"⚠️ Your input is longer than about {MAX_INPUT_TOKENS:,} tokens and will be shortened "
+                   "before sending.")
+    if user_input.strip():
+        system_instruction, prompt = build_template_request(selected_template, user_input, settings,
+                                                            max_input_tokens=None)
+        st.caption(f"🔢 Prompt size: ~{count_tokens(prompt):,} tokens "
+                   f"(+ ~{count_tokens(system_instruction):,} in the template's system instruction)")
+    
+    # Generate button with enhanced styling
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col2:
+        if st.button("🚀 Generate LinkedIn Post", key="generate_btn", width="stretch"):
+            if user_input.strip():
+                try:
+                    cached, request = start_generation(
+                        api_key, selected_template, user_input, settings, variant_count=options.variant_count,
+                        stream=options.stream_output, use_cache=options.use_cache
                     )
-                    
-                    st.markdown('</div>', unsafe_allow_html=True)
-                
-                with col2:
-                    if show_analytics:
-                        st.header("📊 Post Metrics")
-                        metrics = calculate_post_metrics(edited_post)
-                        
-                        # Metrics display
-                        st.markdown(f"""
-                        <div class="metric-card">
-                            <div class="metric-value">{metrics.character_count}</div>
-                            <div class="metric-label">Characters</div>
-                        </div>
-                        """, unsafe_allow_html=True)
-                        
-                        st.markdown(f"""
-                        <div class="metric-card">
-                            <div class="metric-value">{metrics.word_count}</div>
-                            <div class="metric-label">Words</div>
-                        </div>
-                        """, unsafe_allow_html=True)
-                        
-                        st.markdown(f"""
-                        <div class="metric-card">
-                            <div class="metric-value">{metrics.hashtag_count}</div>
-                            <div class="metric-label">Hashtags</div>
-                        </div>
-                        """, unsafe_allow_html=True)
-                        
-                        # Engagement score
-                        score_color = "#28a745" if metrics.engagement_score >= 7 else "#ffc107" if metrics.engagement_score >= 4 else "#dc3545"
-                        st.markdown(f"""
-                        <div class="engagement-score" style="background: {score_color};">
-                            Engagement Score: {metrics.engagement_score:.1f}/10
-                        </div>
-                        """, unsafe_allow_html=True)
+                    st.session_state.pending_generation = {
+                        'request_id': request.id if request is not None else None,
+                        'cached': cached,
+                        'variant_count': options.variant_count,
+                        'template': options.template_name,
+                        'settings': settings,
+                        'input': user_input,
+                        'image_size': IMAGE_SIZES[options.image_size_names[0]]
+                        if options.generate_image and options.image_size_names else None
+                    }
+                except Exception as e:
+                    st.error(f"❌ Error generating post: {str(e)}")
+                    st.info("💡 Please check your API key and try again.")
+            else:
+                st.warning("⚠️ Please provide input for your post.")
+    
+    # The request runs on the generation service; poll it until it finishes, then finish up here
+    pending = st.session_state.pending_generation
+    if pending is not None:
+        request = get_generation_service().get(pending['request_id'])
+        if request is None or request.done:
+            st.session_state.pending_generation = None
+            finish_generation(pending, request)
+        else:
+            generation_progress(request.id)
+    
+    # Display generated content
+    if st.session_state.generated_post:
+        st.divider()
+        
+        post_editor_panel(options.show_analytics, settings['hashtags'])
+        
+        # Candidates from multi-variant generation, best first
+        if len(st.session_state.post_variants) > 1:
+            st.subheader("🏆 Ranked Variants")
+            variant_cols = st.columns(len(st.session_state.post_variants))
+            for rank, (variant_col, (variant, variant_metrics)) in enumerate(
+                    zip(variant_cols, st.session_state.post_variants), start=1):
+                with variant_col, st.container(border=True):
+                    st.markdown(
+                        f"**#{rank}** · Engagement {variant_metrics.engagement_score:.1f}/10 · "
+                        f"{variant_metrics.readability_score}"
+                    )
+                    st.caption(f"{variant_metrics.character_count} characters · "
+                               f"{variant_metrics.hashtag_count} hashtags")
+                    st.code(variant, language=None, wrap_lines=True, height=250)
+                    is_current = variant == st.session_state.generated_post
+                    if st.button("✅ Selected" if is_current else "Use This Variant", key=f"use_variant_{rank}",
+                                 disabled=is_current, width="stretch"):
+                        set_generated_post(variant)
+                        update_history_content(st.session_state.variant_source, variant)
+                        st.rerun()
+        
+        # Action buttons; the editor fragment keeps its current text in session state
+        edited_post = st.session_state.post_editor
+        st.subheader("🎬 Actions")
+        col1, col2, col3, col4 = st.columns(4)
+        enhance_placeholder = st.empty()
+        
+        with col1:
+            if st.button("📋 Copy Post", width="stretch"):
+                st.code(edited_post, language=None)
+                st.success("Ready to copy!")
+        
+        with col2:
+            if st.button("🔄 Regenerate", width="stretch"):
+                st.session_state.generated_post = ""
+                st.rerun()
+        
+        with col3:
+            if st.button("✨ Enhance", width="stretch"):
+                with st.spinner("Enhancing your post..."):
+                    try:
+                        enhance_prompt = f"""
+                        Enhance this LinkedIn post to maximize engagement:
                         
-                        st.write(f"**Readability:** {metrics.readability_score}")
+                        {edited_post}
                         
-                        # Recommendations
-                        with st.expander("💡 Optimization Tips"):
-                            recommendations = []
-                            if metrics.character_count > 1300:
-                                recommendations.append("Consider shortening for better engagement")
-                            if metrics.hashtag_count == 0 and include_hashtags:
-                                recommendations.append("Add hashtags to increase discoverability")
-                            if metrics.engagement_score < 5:
-                                recommendations.append("Add questions or call-to-actions to boost engagement")
-                            if '?' not in edited_post:
-                                recommendations.append("Consider adding a question to encourage comments")
-                            
-                            for rec in recommendations:
-                                st.write(f"• {rec}")
-                
-                # Action buttons
-                st.subheader("🎬 Actions")
-                col1, col2, col3, col4, col5 = st.columns(5)
-                
-                with col1:
-                    if st.button("📋 Copy Post", use_container_width=True):
-                        st.code(edited_post, language=None)
-                        st.success("Ready to copy!")
-                
-                with col2:
-                    if st.button("🔄 Regenerate", use_container_width=True):
-                        st.session_state.generated_post = ""
+                        Improvements to make:
+                        - Stronger hook in the first line
+                        - Better storytelling flow
+                        - More compelling call-to-action
+                        - Strategic emoji placement
+                        - Improved readability
+                        - Keep core message intact
+                        """
+
+                        model = get_model(api_key, TEXT_MODEL)
+                        if options.stream_output:
+                            enhanced_text = render_stream(
+                                stream_text(api_key, model, enhance_prompt), enhance_placeholder
+                            )
+                        else:
+                            enhanced_text = generate_content(api_key, model, enhance_prompt).text
+                        set_generated_post(enhanced_text)
                         st.rerun()
-                
-                with col3:
+                    except Exception as e:
+                        st.error(f"Enhancement failed: {str(e)}")
+        
+        with col4:
+            if options.generate_image and st.button("🎨 Create Image", width="stretch"):
+                if not options.image_size_names or not options.export_formats:
+                    st.warning("Select at least one image size and format.")
+                else:
+                    from image_export import start_export
+                    from post_image import create_post_image
+                    sizes = [IMAGE_SIZES[name] for name in options.image_size_names]
+                    if st.session_state.image_export is not None:
+                        st.session_state.image_export.cancel()
+                    # Rendering one preview is cheap; encoding every size and format runs on the export pool
+                    st.session_state.image_preview = create_post_image(edited_post, options.template_name, sizes[0])
+                    st.session_state.image_export = start_export(
+                        edited_post, options.template_name, sizes, options.export_formats, options.export_quality,
+                        prefix=f"linkedin_post_image_{datetime.datetime.now().strftime('%Y%m%d_%H%M')}"
+                    )
+        
+        if options.generate_image and st.session_state.image_preview is not None:
+            st.subheader("🖼️ Post Image")
+            st.image(st.session_state.image_preview, caption="Generated Post Image", width="stretch")
+            export_job = st.session_state.image_export
+            if export_job is None:
+                st.caption("Use 🎨 Create Image to export every selected size and format.")
+            elif export_job.done():
+                for error in export_job.errors():
+                    st.error(f"Image export failed: {error}")
+                if len(export_job.errors()) < len(export_job.futures):
                     st.download_button(
-                        label="💾 Download",
-                        data=edited_post,
-                        file_name=f"linkedin_post_{datetime.datetime.now().strftime('%Y%m%d_%H%M')}.txt",
-                        mime="text/plain",
-                        use_container_width=True
+                        label="📥 Download Images (ZIP)",
+                        data=export_job.zip_bytes(),
+                        file_name=f"{export_job.prefix}.zip",
+                        mime="application/zip"
                     )
-                
-                with col4:
-                    if st.button("✨ Enhance", use_container_width=True):
-                        with st.spinner("Enhancing your post..."):
-                            try:
-                                enhance_prompt = f"""
-                                Enhance this LinkedIn post to maximize engagement:
-                                
-                                {edited_post}
-                                
-                                Improvements to make:
-                                - Stronger hook in the first line
-                                - Better storytelling flow
-                                - More compelling call-to-action
-                                - Strategic emoji placement
-                                - Improved readability
-                                - Keep core message intact
-                                """
-                                
-                                genai.configure(api_key=api_key)
-                                model = genai.GenerativeModel('gemini-1.5-flash')
-                                enhanced_response = model.generate_content(enhance_prompt)
-                                st.session_state.generated_post = enhanced_response.text
-                                st.rerun()
-                            except Exception as e:
-                                st.error(f"Enhancement failed: {str(e)}")
-                
-                with col5:
-                    if generate_image and st.button("🎨 Create Image", use_container_width=True):
-                        with st.spinner("Creating post image..."):
-                            try:
-                                post_image = create_post_image(edited_post)
-                                st.image(post_image, caption="Generated Post Image", use_container_width=True)
-                                
-                                # Convert to bytes for download
-                                img_buffer = io.BytesIO()
-                                post_image.save(img_buffer, format='PNG')
-                                img_data = img_buffer.getvalue()
-                                
-                                st.download_button(
-                                    label="📥 Download Image",
-                                    data=img_data,
-                                    file_name=f"linkedin_post_image_{datetime.datetime.now().strftime('%Y%m%d_%H%M')}.png",
-                                    mime="image/png"
-                                )
-                            except Exception as e:
-                                st.error(f"Image generation failed: {str(e)}")
+            else:
+                image_export_progress()
+
+@st.fragment
+def render_batch_tab(api_key: str, options: CreateOptions):
+    """Batch tab: generate one post per row of an uploaded file"""
+    settings = options.settings
+    
+    # Batch generation
+    st.header("📦 Batch Post Generation")
+    st.markdown("""
+    Upload a **CSV** or **JSONL** file with one post per row. Each row needs an `input` (or `topic`) 
+    and may set `template`, `tone`, `length`, `industry`, `audience`, `hashtags`, `cta` and `emojis`; 
+    anything left out uses the sidebar settings.
+    """)
+    
+    col1, col2 = st.columns([2, 1])
+    with col1:
+        batch_file = st.file_uploader("Batch input file", type=["csv", "jsonl", "json"])
+        batch_templates = st.multiselect(
+            "Templates for rows without a template",
+            list(POST_TEMPLATES.keys()),
+            default=[options.template_name],
+            help="Each row without a template is generated once per selected template"
+        )
+    with col2:
+        batch_workers = st.slider("Concurrent requests", min_value=1, max_value=8, value=3)
+    
+    if 'batch_results' not in st.session_state:
+        st.session_state.batch_results = []
+    
+    if batch_file is not None:
+        try:
+            batch_items = parse_batch_file(
+                batch_file.getvalue(), batch_file.name, settings,
+                list(POST_TEMPLATES.keys()), batch_templates
+            )
+        except ValueError as e:
+            st.error(f"❌ Invalid batch file: {str(e)}")
+            batch_items = []
         
-        with tab2:
-            # Analytics dashboard
-            st.header("📊 Advanced Analytics Dashboard")
-            
-            if st.session_state.post_history:
-                # Create analytics data
-                analytics_df = pd.DataFrame([
-                    {
-                        'Date': post['timestamp'].date(),
-                        'Template': post['template'],
-                        'Characters': len(post['content']),
-                        'Words': len(post['content'].split()),
-                        'Hashtags': len(re.findall(r'#\w+', post['content'])),
-                        'Engagement_Score': calculate_post_metrics(post['content']).engagement_score
-                    }
-                    for post in st.session_state.post_history
-                ])
+        if batch_items:
+            st.caption(f"{len(batch_items)} posts queued")
+            if st.button("🚀 Generate Batch", key="batch_btn", width="stretch"):
+                st.session_state.batch_results = []
+                progress = st.progress(0.0, text="Starting batch...")
+                status_placeholder = st.empty()
+                statuses = {
+                    'Template': [item.template for item in batch_items],
+                    'Input': [item.user_input[:60] for item in batch_items],
+                    'Status': ['⏳ Queued'] * len(batch_items)
+                }
+                status_placeholder.dataframe(statuses, width="stretch")
                 
-                # Overview metrics
-                col1, col2, col3, col4 = st.columns(4)
+                def generate_batch_item(item):
+                    return generate_content_with_template(
+                        api_key, POST_TEMPLATES[item.template], item.user_input, item.settings,
+                        use_cache=options.use_cache
+                    )
                 
-                with col1:
-                    st.markdown(f"""
-                    <div class="metric-card">
-                        <div class="metric-value">{len(st.session_state.post_history)}</div>
-                        <div class="metric-label">Posts Created</div>
-                    </div>
-                    """, unsafe_allow_html=True)
+                failures = 0
+                for done, result in enumerate(run_batch(batch_items, generate_batch_item, batch_workers), 1):
+                    if result.ok:
+                        add_to_history({
+                            'timestamp': datetime.datetime.now(),
+                            'template': result.item.template,
+                            'content': result.content,
+                            'settings': result.item.settings,
+                            'input': result.item.user_input
+                        })
+                        statuses['Status'][result.item.index] = f"✅ Done ({result.duration:.1f}s)"
+                    else:
+                        failures += 1
+                        statuses['Status'][result.item.index] = f"❌ {result.error[:80]}"
+                    st.session_state.batch_results.append(result.to_json())
+                    progress.progress(done / len(batch_items), text=f"Generated {done}/{len(batch_items)} posts")
+                    status_placeholder.dataframe(statuses, width="stretch")
                 
+                if failures:
+                    st.warning(f"⚠️ {failures} of {len(batch_items)} posts failed. See the status column for details.")
+                else:
+                    st.success(f"✅ Generated {len(batch_items)} posts")
+    
+    if st.session_state.batch_results:
+        st.download_button(
+            label="📥 Download Results (JSONL)",
+            data="\n".join(st.session_state.batch_results) + "\n",
+            file_name=f"linkedin_batch_{datetime.datetime.now().strftime('%Y%m%d_%H%M')}.jsonl",
+            mime="application/jsonl"
+        )
+
+@st.fragment
+def render_history_tab():
+    """History tab: one page of saved posts, bodies loaded when opened"""
+    # Post history
+    st.header("📚 Post History")
+    
+    history = st.session_state.post_history
+    col1, col2, col3 = st.columns([2, 1, 1])
+    with col1:
+        search_query = st.text_input(
+            "🔍 Search posts",
+            placeholder="Find posts by keyword...",
+            key="history_search"
+        )
+    with col2:
+        template_filter = st.selectbox("Template", ["All Templates"] + history.templates(), key="history_template")
+    with col3:
+        page_size = st.selectbox("Posts per page", [10, 25, 50, 100], key="history_page_size")
+    template_filter = None if template_filter == "All Templates" else template_filter
+    
+    total_posts = history.count(template=template_filter, query=search_query)
+    if total_posts:
+        total_pages = (total_posts + page_size - 1) // page_size
+        # Clamped when filters or page size changed under the current page; re-seeded when a fragment rerun
+        # that found no posts skipped the pager and Streamlit dropped its state
+        st.session_state.history_page = min(st.session_state.get("history_page", 1), total_pages)
+        page = st.number_input(f"Page (of {total_pages})", min_value=1, max_value=total_pages, key="history_page")
+        offset = (page - 1) * page_size
+        st.caption(f"Showing {offset + 1}-{min(offset + page_size, total_posts)} of {total_posts} posts")
+        
+        # Only the current page is queried; bodies load when an entry is opened
+        for idx, summary in enumerate(history.list_summaries(offset, page_size, template_filter, search_query)):
+            post_id = summary['id']
+            with st.container(border=True):
+                col1, col2, col3 = st.columns([3, 1, 1])
+                with col1:
+                    st.markdown(f"**Post #{offset + idx + 1} - {summary['template']}** "
+                                f"({summary['timestamp'].strftime('%Y-%m-%d %H:%M')})")
+                    preview = summary['preview'].replace("\n", " ")
+                    if summary['character_count'] > len(summary['preview']):
+                        preview += "…"
+                    st.caption(preview)
                 with col2:
-                    avg_engagement = analytics_df['Engagement_Score'].mean()
                     st.markdown(f"""
                     <div class="metric-card">
-                        <div class="metric-value">{avg_engagement:.1f}/10</div>
-                        <div class="metric-label">Avg Engagement</div>
+                        <div class="metric-value">{summary['word_count']}</div>
+                        <div class="metric-label">Words</div>
                     </div>
                     """, unsafe_allow_html=True)
-                
                 with col3:
-                    most_used_template = analytics_df['Template'].mode()[0] if not analytics_df.empty else "N/A"
                     st.markdown(f"""
                     <div class="metric-card">
-                        <div class="metric-value">{most_used_template}</div>
-                        <div class="metric-label">Top Template</div>
+                        <div class="metric-value">{summary['engagement_score']:.1f}/10</div>
+                        <div class="metric-label">Engagement</div>
                     </div>
                     """, unsafe_allow_html=True)
                 
-                with col4:
-                    avg_words = analytics_df['Words'].mean() if not analytics_df.empty else 0
-                    st.markdown(f"""
-                    <div class="metric-card">
-                        <div class="metric-value">{int(avg_words)}</div>
-                        <div class="metric-label">Avg Words</div>
-                    </div>
-                    """, unsafe_allow_html=True)
-                
-                st.divider()
-                
-                # Charts section
-                col1, col2 = st.columns(2)
-                
-                with col1:
-                    st.subheader("Engagement Over Time")
-                    if not analytics_df.empty:
-                        fig = px.line(
-                            analytics_df, 
-                            x='Date', 
-                            y='Engagement_Score',
-                            markers=True,
-                            labels={'Engagement_Score': 'Engagement Score'},
-                            color_discrete_sequence=['#0077b5']
-                        )
-                        fig.update_layout(
-                            xaxis_title='Date',
-                            yaxis_title='Score (0-10)',
-                            yaxis_range=[0,10],
-                            plot_bgcolor='rgba(0,0,0,0)',
-                            paper_bgcolor='rgba(0,0,0,0)'
-                        )
-                        st.plotly_chart(fig, use_container_width=True)
-                    else:
-                        st.info("No analytics data yet")
-                
-                with col2:
-                    st.subheader("Template Performance")
-                    if not analytics_df.empty:
-                        template_df = analytics_df.groupby('Template')['Engagement_Score'].mean().reset_index()
-                        fig = px.bar(
-                            template_df,
-                            x='Template',
-                            y='Engagement_Score',
-                            labels={'Engagement_Score': 'Avg Engagement Score'},
-                            color='Engagement_Score',
-                            color_continuous_scale='Blues'
-                        )
-                        fig.update_layout(
-                            xaxis_title='Template',
-                            yaxis_title='Avg Score',
-                            yaxis_range=[0,10],
-                            plot_bgcolor='rgba(0,0,0,0)',
-                            paper_bgcolor='rgba(0,0,0,0)'
-                        )
-                        st.plotly_chart(fig, use_container_width=True)
-                    else:
-                        st.info("No template data yet")
-                
-                st.divider()
-                
-                # Detailed metrics
-                st.subheader("Detailed Post Metrics")
-                if not analytics_df.empty:
-                    # Add calculated metrics
-                    analytics_df['Readability'] = analytics_df.apply(
-                        lambda row: calculate_post_metrics(
-                            st.session_state.post_history[row.name]['content']
-                        ).readability_score, 
-                        axis=1
+                if st.toggle("Show full post", key=f"open_{post_id}"):
+                    post = history.get(post_id)
+                    st.text_area(
+                        f"Content #{offset + idx + 1}", 
+                        value=post['content'], 
+                        height=200,
+                        key=f"history_{post_id}"
                     )
                     
-                    # Display dataframe with formatting
-                    st.dataframe(
-                        analytics_df[['Date', 'Template', 'Words', 'Hashtags', 
-                                    'Engagement_Score', 'Readability']]
-                        .sort_values('Date', ascending=False)
-                        .rename(columns={
-                            'Date': 'Date',
-                            'Template': 'Template',
-                            'Words': 'Words',
-                            'Hashtags': 'Hashtags',
-                            'Engagement_Score': 'Engagement',
-                            'Readability': 'Readability'
-                        }),
-                        use_container_width=True
-                    )
-                else:
-                    st.info("Generate more posts to see detailed metrics")
-            else:
-                st.info("📝 Generate your first post to see analytics")
+                    # Action buttons
+                    if st.button(f"✏️ Load into Editor", key=f"load_{post_id}"):
+                        # The Create tab is another fragment; it picks this up when the tab switch reruns the app
+                        set_generated_post(post['content'])
+                        st.session_state.current_template = post['template']
+                        st.success("Post loaded into editor! Switch to Create tab.")
+                    
+                    if st.button(f"🗑️ Delete", key=f"delete_{post_id}"):
+                        history.delete(post_id)
+                        if st.session_state.analytics_data is not None:
+                            st.session_state.analytics_data.remove(post_id)
+                        st.rerun()
+    elif search_query or template_filter:
+        st.info("No posts match your filters.")
+    else:
+        st.info("📭 Your post history is empty. Generate your first post!")
+
+@st.fragment
+def render_learning_hub():
+    """Learning Hub tab: static guides"""
+    # Learning Hub
+    st.header("🎓 LinkedIn Content Learning Hub")
+    
+    with st.expander("📝 LinkedIn Best Practices"):
+        st.markdown("""
+        **Crafting High-Performing LinkedIn Content:**
         
-        with tab3:
-            # Post history
-            st.header("📚 Post History")
-            
-            if st.session_state.post_history:
-                # Sort history by timestamp descending
-                sorted_history = sorted(
-                    st.session_state.post_history, 
-                    key=lambda x: x['timestamp'], 
-                    reverse=True
-                )
-                
-                for idx, post in enumerate(sorted_history):
-                    with st.expander(f"Post #{idx+1} - {post['template']} ({post['timestamp'].strftime('%Y-%m-%d %H:%M')})"):
-                        col1, col2 = st.columns([3, 1])
-                        with col1:
-                            st.markdown(f"**Template Used:** {post['template']}")
-                            st.text_area(
-                                f"Content #{idx+1}", 
-                                value=post['content'], 
-                                height=200,
-                                key=f"history_{idx}"
-                            )
-                        with col2:
-                            metrics = calculate_post_metrics(post['content'])
-                            st.markdown(f"""
-                            <div class="metric-card">
-                                <div class="metric-value">{metrics.word_count}</div>
-                                <div class="metric-label">Words</div>
-                            </div>
-                            """, unsafe_allow_html=True)
-                            
-                            st.markdown(f"""
-                            <div class="metric-card">
-                                <div class="metric-value">{metrics.engagement_score:.1f}/10</div>
-                                <div class="metric-label">Engagement</div>
-                            </div>
-                            """, unsafe_allow_html=True)
-                        
-                        # Action buttons
-                        if st.button(f"✏️ Load into Editor", key=f"load_{idx}"):
-                            st.session_state.generated_post = post['content']
-                            st.session_state.current_template = post['template']
-                            st.success("Post loaded into editor! Switch to Create tab.")
-                        
-                        if st.button(f"🗑️ Delete", key=f"delete_{idx}"):
-                            del st.session_state.post_history[idx]
-                            st.rerun()
-            else:
-                st.info("📭 Your post history is empty. Generate your first post!")
+        - 💡 **Hook in First 3 Lines:** Capture attention immediately with a strong hook
+        - 👥 **Add Value First:** Focus on audience needs before self-promotion
+        - 🔢 **Use Formatting:** Short paragraphs (2-3 lines), bullet points, emojis
+        - ❓ **Ask Questions:** Boost comments by ending with a question
+        - 🏷️ **Strategic Hashtags:** Use 3-5 relevant hashtags (#Industry, #Topic)
+        - 📸 **Visuals Matter:** Posts with images get 2x more engagement
+        - ⏰ **Timing:** Best posting times: 8-10AM & 5-6PM (local time)
+        """)
+    
+    with st.expander("🚀 Content Strategy Tips"):
+        st.markdown("""
+        **Effective Content Strategy Framework:**
+        
+        1. **Define Your Pillars (3-5 core topics):**
+           - Professional expertise
+           - Industry insights
+           - Personal development
+           - Company culture
+        
+        2. **Content Mix Balance:**
+           - 50% Educational/Insights
+           - 30% Industry News/Commentary
+           - 20% Personal/Behind-the-Scenes
+        
+        3. **Engagement Boosters:**
+           - Use "What do you think?" instead of "Thoughts?"
+           - Tag relevant people in comments
+           - Respond to all comments within 24 hours
+        
+        4. **Optimal Post Length:**
+           - 800-1,300 characters performs best
+           - Minimum 3 paragraphs for storytelling
+        """)
+    
+    with st.expander("📊 Analytics Guide"):
+        st.markdown("""
+        **Understanding Engagement Metrics:**
+        
+        - 👍 **Engagement Rate Formula:**  
+          (Reactions + Comments + Shares) / Impressions × 100
+        - 🎯 **Benchmarks:**
+          - Good: 2-5% engagement rate
+          - Excellent: 5%+ engagement rate
+        
+        **Improving Key Metrics:**
         
+        | Metric       | How to Improve                     |
+        |--------------|------------------------------------|
+        | Impressions  | Post consistently (3-5x/week)      |
+        | CTR          | Use compelling hooks & visuals     |
+        | Comments     | End with open-ended questions      |
+        | Shares       | Create unique insights/data        |
+        
+        **Algorithm Factors:**
+        - Dwell time (how long people view your post)
+        - Comment reply depth (responses to comments)
+        - Profile completeness (photo, headline, about)
+        """)
+    
+    with st.expander("🤖 AI Prompting Tips"):
+        st.markdown("""
+        **Getting Better Results from AI:**
+        
+        - 🎯 **Be Specific:**  
+          "Create a LinkedIn post about remote work productivity for tech managers focusing on meeting efficiency"
+        
+        - 📚 **Provide Context:**  
+          "I'm a senior developer with 10 years experience in fintech"
+        
+        - 🛠️ **Request Formatting:**  
+          "Use bullet points for key takeaways and include 3 emojis"
+        
+        - 🔄 **Iterate:**  
+          "Make this more inspirational" or "Shorten to under 800 characters"
+        
+        - 🧠 **Add Personality:**  
+          "Include a personal story about overcoming procrastination"
+        """)
+
+@st.fragment
+def render_performance():
+    """Hidden Performance tab: latency percentiles per traced stage and a JSONL export of the raw spans"""
+    st.header("⏱️ Performance")
+    tracer = get_tracer()
+    spans = tracer.spans()
+    st.caption(f"{len(spans)} spans buffered in this server process (newest {tracer.capacity} kept)")
+    if not spans:
+        st.info("No traces yet. Generate a post to record some.")
+        return
+    
+    st.dataframe(tracer.summary(), hide_index=True, width="stretch")
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        st.download_button(
+            label="📥 Export Traces (JSONL)",
+            data=tracer.to_jsonl(),
+            file_name=f"linkedin_traces_{datetime.datetime.now().strftime('%Y%m%d_%H%M')}.jsonl",
+            mime="application/jsonl",
+            width="stretch"
+        )
+    with col2:
+        if st.button("🧹 Clear Traces", width="stretch"):
+            tracer.clear()
+            st.rerun(scope="fragment")
+    
+    with st.expander("Recent spans"):
+        st.dataframe([{
+            'Stage': span.name,
+            'Started': datetime.datetime.fromtimestamp(span.start).strftime('%H:%M:%S.%f')[:-3],
+            'Duration (ms)': round(span.duration * 1000, 1),
+            'Error': span.error or "",
+            'Attributes': ", ".join(f"{key}={value}" for key, value in span.attrs.items())
+        } for span in reversed(spans[-100:])], hide_index=True, width="stretch")
+
+# Main application
+def main():
+    init_session_state()
+    
+    # Header with enhanced styling
+    st.markdown("""
+    <div class="main-header">
+        <h1>🚀 LinkedIn Post Generator Pro</h1>
+        <p>AI-Powered Content Creation with Advanced Analytics & Templates</p>
+    </div>
+    """, unsafe_allow_html=True)
+    
+    api_key, options = render_sidebar()
+    
+    # Main content area
+    if api_key:
+        # Create tabs for different sections
+        # Tab switches rerun the script so the Analytics tab (pandas, plotly) only runs while it is open
+        # The Performance tab is hidden unless the page is opened with ?perf=1
+        tab_labels = ["✍️ Create Post", "📦 Batch Mode", "📊 Analytics", "📚 Post History", "🎓 Learning Hub"]
+        show_performance = st.query_params.get("perf") == "1"
+        if show_performance:
+            tab_labels.append("⏱️ Performance")
+        tabs = st.tabs(tab_labels, key="main_tabs", on_change="rerun")
+        tab1, tab2, tab3, tab4, tab5 = tabs[:5]
+        
+        # Each tab is a fragment: widgets inside one rerun only that tab, with its inputs passed explicitly
+        with tab1:
+            render_create_tab(api_key, options)
+        with tab2:
+            render_batch_tab(api_key, options)
+        with tab3:
+            if tab3.open:
+                render_analytics()
         with tab4:
-            # Learning Hub
-            st.header("🎓 LinkedIn Content Learning Hub")
-            
-            with st.expander("📝 LinkedIn Best Practices"):
-                st.markdown("""
-                **Crafting High-Performing LinkedIn Content:**
-                
-                - 💡 **Hook in First 3 Lines:** Capture attention immediately with a strong hook
-                - 👥 **Add Value First:** Focus on audience needs before self-promotion
-                - 🔢 **Use Formatting:** Short paragraphs (2-3 lines), bullet points, emojis
-                - ❓ **Ask Questions:** Boost comments by ending with a question
-                - 🏷️ **Strategic Hashtags:** Use 3-5 relevant hashtags (#Industry, #Topic)
-                - 📸 **Visuals Matter:** Posts with images get 2x more engagement
-                - ⏰ **Timing:** Best posting times: 8-10AM & 5-6PM (local time)
-                """)
-            
-            with st.expander("🚀 Content Strategy Tips"):
-                st.markdown("""
-                **Effective Content Strategy Framework:**
-                
-                1. **Define Your Pillars (3-5 core topics):**
-                   - Professional expertise
-                   - Industry insights
-                   - Personal development
-                   - Company culture
-                
-                2. **Content Mix Balance:**
-                   - 50% Educational/Insights
-                   - 30% Industry News/Commentary
-                   - 20% Personal/Behind-the-Scenes
-                
-                3. **Engagement Boosters:**
-                   - Use "What do you think?" instead of "Thoughts?"
-                   - Tag relevant people in comments
-                   - Respond to all comments within 24 hours
-                
-                4. **Optimal Post Length:**
-                   - 800-1,300 characters performs best
-                   - Minimum 3 paragraphs for storytelling
-                """)
-            
-            with st.expander("📊 Analytics Guide"):
-                st.markdown("""
-                **Understanding Engagement Metrics:**
-                
-                - 👍 **Engagement Rate Formula:**  
-                  (Reactions + Comments + Shares) / Impressions × 100
-                - 🎯 **Benchmarks:**
-                  - Good: 2-5% engagement rate
-                  - Excellent: 5%+ engagement rate
-                
-                **Improving Key Metrics:**
-                
-                | Metric       | How to Improve                     |
-                |--------------|------------------------------------|
-                | Impressions  | Post consistently (3-5x/week)      |
-                | CTR          | Use compelling hooks & visuals     |
-                | Comments     | End with open-ended questions      |
-                | Shares       | Create unique insights/data        |
-                
-                **Algorithm Factors:**
-                - Dwell time (how long people view your post)
-                - Comment reply depth (responses to comments)
-                - Profile completeness (photo, headline, about)
-                """)
-            
-            with st.expander("🤖 AI Prompting Tips"):
-                st.markdown("""
-                **Getting Better Results from AI:**
-                
-                - 🎯 **Be Specific:**  
-                  "Create a LinkedIn post about remote work productivity for tech managers focusing on meeting efficiency"
-                
-                - 📚 **Provide Context:**  
-                  "I'm a senior developer with 10 years experience in fintech"
-                
-                - 🛠️ **Request Formatting:**  
-                  "Use bullet points for key takeaways and include 3 emojis"
-                
-                - 🔄 **Iterate:**  
-                  "Make this more inspirational" or "Shorten to under 800 characters"
-                
-                - 🧠 **Add Personality:**  
-                  "Include a personal story about overcoming procrastination"
-                """)
+            render_history_tab()
+        with tab5:
+            render_learning_hub()
+        if show_performance:
+            with tabs[5]:
+                if tabs[5].open:
+                    render_performance()
     else:
         st.warning("🔑 Please enter your API key in the sidebar to get started")
 
@@ -0,0 +1,112 @@
+import csv
+import io
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterator, List
+
+# Settings a batch row may override; everything else comes from the sidebar
+BOOLEAN_SETTINGS = ('hashtags', 'cta', 'emojis')
+TEXT_SETTINGS = ('tone', 'length', 'industry', 'audience')
+INPUT_COLUMNS = ('input', 'topic', 'user_input')
+
+@dataclass
+class BatchItem:
+    index: int
+    template: str
+    user_input: str
+    settings: dict
+
+@dataclass
+class BatchResult:
+    item: BatchItem
+    content: str = ""
+    error: str = ""
+    duration: float = 0.0
+    # Set explicitly: some exceptions (e.g. TimeoutError()) have an empty message
+    ok: bool = True
+
+    def to_json(self) -> str:
+        """Serialize as a single JSONL line"""
+        return json.dumps({
+            'index': self.item.index,
+            'template': self.item.template,
+            'input': self.item.user_input,
+            'settings': self.item.settings,
+            'content': self.content,
+            'ok': self.ok,
+            'error': self.error,
+            'duration_seconds': round(self.duration, 3)
+        }, ensure_ascii=False)
+
+def _parse_bool(value) -> bool:
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'y', 'on')
+
+def _read_rows(data: bytes, filename: str) -> List[Dict]:
+    text = data.decode('utf-8-sig')
+    if filename.lower().endswith(('.jsonl', '.json')):
+        rows = []
+        for line_no, line in enumerate(text.splitlines(), 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Line {line_no}: invalid JSON ({e.msg})")
+            if not isinstance(row, dict):
+                raise ValueError(f"Line {line_no}: expected a JSON object")
+            rows.append(row)
+        return rows
+    return list(csv.DictReader(io.StringIO(text)))
+
+def parse_batch_file(data: bytes, filename: str, default_settings: dict, known_templates: List[str],
+                     default_templates: List[str]) -> List[BatchItem]:
+    """Turn an uploaded CSV/JSONL file into batch items"""
+    items = []
+    for row_no, row in enumerate(_read_rows(data, filename), 1):
+        row = {str(k).strip().lower(): v for k, v in row.items() if k is not None}
+        user_input = next((str(row[col]).strip() for col in INPUT_COLUMNS if row.get(col)), "")
+        if not user_input:
+            raise ValueError(f"Row {row_no}: missing input (expected one of: {', '.join(INPUT_COLUMNS)})")
+
+        settings = dict(default_settings)
+        for key in TEXT_SETTINGS:
+            if row.get(key):
+                settings[key] = str(row[key]).strip()
+        for key in BOOLEAN_SETTINGS:
+            if row.get(key) not in (None, ""):
+                settings[key] = _parse_bool(row[key])
+
+        # Rows without a template fan out across the selected defaults (20 topics x 3 templates = 60 items)
+        template = str(row.get('template') or "").strip()
+        templates = [template] if template else default_templates
+        if not templates:
+            raise ValueError(f"Row {row_no}: no template given and no default templates selected")
+        for name in templates:
+            if name not in known_templates:
+                raise ValueError(f"Row {row_no}: unknown template '{name}'")
+            items.append(BatchItem(index=len(items), template=name, user_input=user_input, settings=settings))
+    return items
+
+def run_batch(items: List[BatchItem], generate: Callable[[BatchItem], str],
+              max_workers: int = 3) -> Iterator[BatchResult]:
+    """Run generate over items on a bounded thread pool, yielding results as they complete"""
+    def run_one(item: BatchItem) -> BatchResult:
+        start = time.perf_counter()
+        try:
+            return BatchResult(item=item, content=generate(item), duration=time.perf_counter() - start)
+        except Exception as e:
+            return BatchResult(item=item, error=str(e) or type(e).__name__, duration=time.perf_counter() - start,
+                               ok=False)
+
+    executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="batch")
+    try:
+        futures = [executor.submit(run_one, item) for item in items]
+        for future in as_completed(futures):
+            yield future.result()
+    finally:
+        # Stop queued work if the caller stops consuming results early
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,228 @@
+"""Offline throughput and latency benchmark for the generation paths
+
+Usage: python benchmarks/bench_generation.py [--requests N] [--concurrency C] [--latency-ms MS]
+                                             [--jitter-ms MS] [--error-rate R] [--throttle-rate R]
+                                             [--posts N] [--images N] [--only NAME ...]
+                                             [--baseline PATH] [--save-baseline] [--tolerance T]
+
+Template generation runs against benchmarks/fake_gemini.py, so no API key or quota is needed.
+Results are compared with the stored baseline; exits non-zero when a scenario's throughput
+drops or its p95 grows by more than the tolerance. Baselines are machine-specific: refresh
+baseline.json with --save-baseline on the machine that runs the check.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Callable, Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+SCENARIOS = ("generate", "generate_cached", "metrics", "image", "analytics")
+
+@dataclass
+class Result:
+    scenario: str
+    ops: int
+    errors: int
+    seconds: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+
+    @property
+    def ops_per_sec(self) -> float:
+        return self.ops / self.seconds if self.seconds else 0.0
+
+def _configure_environment(endpoint: str, workdir: str) -> None:
+    # Must run before the app modules are imported: quotas and store paths are read at import
+    os.environ["GEMINI_API_ENDPOINT"] = endpoint
+    os.environ["GEMINI_REQUESTS_PER_MINUTE"] = "1000000"
+    os.environ["GEMINI_REQUESTS_PER_DAY"] = "1000000000"
+    os.environ["GEMINI_TOKENS_PER_MINUTE"] = "1000000000"
+    os.environ["POST_CACHE_PATH"] = os.path.join(workdir, "responses.sqlite3")
+    os.environ["POST_HISTORY_DB"] = os.path.join(workdir, "history.sqlite3")
+
+def _measure(scenario: str, calls: List[Callable[[], object]], concurrency: int = 1) -> Result:
+    """Run calls on concurrency threads, timing each call and the whole batch"""
+    timings: List[float] = []
+    errors = 0
+
+    def timed(call):
+        started = time.perf_counter()
+        try:
+            call()
+            return time.perf_counter() - started, None
+        except Exception as e:
+            return time.perf_counter() - started, e
+
+    start = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            outcomes = list(executor.map(timed, calls))
+    else:
+        outcomes = [timed(call) for call in calls]
+    seconds = time.perf_counter() - start
+
+    from tracing import percentile
+    for duration, error in outcomes:
+        timings.append(duration * 1000)
+        errors += error is not None
+    timings.sort()
+    return Result(scenario, len(calls) - errors, errors, seconds, statistics.median(timings),
+                  percentile(timings, 0.95), percentile(timings, 0.99))
+
+def _posts(count: int) -> List[str]:
+    from fake_gemini import SAMPLE_POST
+    # Distinct texts so per-text caches do not turn the run into lookups
+    return [f"{SAMPLE_POST}\n\nTake #{i}: what would you add?" for i in range(count)]
+
+def run_generate(args, cached: bool) -> Result:
+    from post_generator import POST_TEMPLATES, generate_content_with_template
+    templates = list(POST_TEMPLATES.values())
+    settings = {'tone': "Professional", 'length': "Medium (300-800 chars)", 'industry': "Technology",
+                'audience': "All Professionals", 'hashtags': True, 'cta': True, 'emojis': True}
+    if not cached:
+        # The SDK import and one model per template happen once per process; keep them out of the timings
+        for template in templates:
+            generate_content_with_template("bench-key", template, "warm-up", settings, use_cache=False)
+    calls = [
+        (lambda i=i: generate_content_with_template(
+            "bench-key", templates[i % len(templates)], f"Topic: remote work habits #{i}", settings, use_cache=cached
+        ))
+        for i in range(args.requests)
+    ]
+    return _measure("generate_cached" if cached else "generate", calls, args.concurrency)
+
+def run_metrics(args) -> Result:
+    import post_metrics
+    with post_metrics._cache_lock:
+        post_metrics._cache.clear()
+    # Each text is new to the metrics cache, so every call is a full analysis
+    return _measure("metrics", [lambda text=text: post_metrics.calculate_post_metrics(text)
+                                for text in _posts(args.posts * 10)])
+
+def run_image(args) -> Result:
+    from image_options import IMAGE_SIZES
+    from post_image import TEMPLATE_STYLES, create_post_image
+    sizes = list(IMAGE_SIZES.values())
+    styles = list(TEMPLATE_STYLES)
+    texts = _posts(args.images)
+    # Fonts and gradients load once per process; keep that out of the timings
+    create_post_image(texts[0], styles[0], sizes[0])
+    return _measure("image", [
+        lambda i=i: create_post_image(texts[i], styles[i % len(styles)], sizes[i % len(sizes)])
+        for i in range(args.images)
+    ])
+
+def run_analytics(args) -> Result:
+    import datetime
+    from analytics import AnalyticsTable
+    now = datetime.datetime.now()
+    posts = [{'id': i + 1, 'timestamp': now - datetime.timedelta(hours=i), 'template': "Industry Insight",
+              'content': text} for i, text in enumerate(_posts(args.posts))]
+    return _measure("analytics", [lambda: AnalyticsTable(posts).frame for _ in range(5)])
+
+def compare(results: List[Result], baseline: Dict[str, Dict], tolerance: float,
+            min_delta_ms: float = 2.0) -> List[str]:
+    """Regressions against the baseline: lower throughput or higher p95 beyond the tolerance
+
+    p95 changes smaller than min_delta_ms are scheduling noise for sub-millisecond operations.
+    """
+    regressions = []
+    for result in results:
+        base = baseline.get(result.scenario)
+        if base is None:
+            continue
+        if result.ops_per_sec < base['ops_per_sec'] * (1 - tolerance):
+            regressions.append(f"{result.scenario}: {result.ops_per_sec:.1f} ops/s vs baseline "
+                               f"{base['ops_per_sec']:.1f}")
+        if result.p95_ms > max(base['p95_ms'] * (1 + tolerance), base['p95_ms'] + min_delta_ms):
+            regressions.append(f"{result.scenario}: p95 {result.p95_ms:.1f} ms vs baseline {base['p95_ms']:.1f} ms")
+    return regressions
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200, help="template generations per generate scenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency-ms", type=float, default=200.0)
+    parser.add_argument("--jitter-ms", type=float, default=50.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of fake API calls failing with 500")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="share of fake API calls answered with 429")
+    parser.add_argument("--posts", type=int, default=2000,
+                        help="posts per analytics build; the metrics scenario scores ten times as many")
+    parser.add_argument("--images", type=int, default=30)
+    parser.add_argument("--only", nargs="+", choices=SCENARIOS)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--min-delta-ms", type=float, default=2.0, help="ignore smaller p95 increases")
+    args = parser.parse_args()
+
+    from fake_gemini import FakeGeminiServer, FaultProfile
+    server = FakeGeminiServer(profile=FaultProfile(args.latency_ms, args.jitter_ms, args.error_rate,
+                                                   args.throttle_rate)).start()
+    workdir = tempfile.mkdtemp(prefix="bench_generation_")
+    _configure_environment(server.endpoint, workdir)
+
+    runners = {
+        "generate": lambda: run_generate(args, cached=False),
+        # Same requests again, now answered from the response cache the first pass filled
+        "generate_cached": lambda: run_generate(args, cached=True),
+        "metrics": lambda: run_metrics(args),
+        "image": lambda: run_image(args),
+        "analytics": lambda: run_analytics(args),
+    }
+    selected = args.only or list(SCENARIOS)
+    if "generate_cached" in selected and "generate" not in selected:
+        selected.insert(selected.index("generate_cached"), "generate")
+
+    results = []
+    print(f"{'scenario':<17}{'ops':>7}{'errors':>8}{'ops/s':>10}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    try:
+        for scenario in selected:
+            result = runners[scenario]()
+            results.append(result)
+            print(f"{scenario:<17}{result.ops:>7}{result.errors:>8}{result.ops_per_sec:>10.1f}"
+                  f"{result.p50_ms:>9.1f}{result.p95_ms:>9.1f}{result.p99_ms:>9.1f}")
+    finally:
+        server.stop()
+    print(f"fake API calls: {server.requests}")
+
+    if args.save_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, encoding="utf-8") as f:
+                baseline = json.load(f)
+        for result in results:
+            baseline[result.scenario] = {key: round(value, 3) if isinstance(value, float) else value
+                                         for key, value in asdict(result).items()}
+            baseline[result.scenario]['ops_per_sec'] = round(result.ops_per_sec, 2)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save-baseline to create one")
+        return 0
+    with open(args.baseline, encoding="utf-8") as f:
+        regressions = compare(results, json.load(f), args.tolerance, args.min_delta_ms)
+    for regression in regressions:
+        print(f"FAIL: {regression}")
+    if regressions:
+        return 1
+    print(f"OK: no scenario regressed more than {args.tolerance:.0%} against the baseline")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
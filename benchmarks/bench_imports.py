@@ -0,0 +1,89 @@
+"""Cold import-time benchmark for the Streamlit apps
+
+Usage: python benchmarks/bench_imports.py [--runs N] [--budget-ms MS] [--top N]
+
+Each run imports a page module in a fresh interpreter after streamlit itself, which every page
+needs anyway, so the timing is what the page adds to a cold start. Exits non-zero when a page
+loads one of the deferred heavy dependencies at import or its median exceeds the budget.
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PAGES = ("app", "main")
+# Imported only by the code paths that use them: Analytics tab, image rendering, first model
+DEFERRED_MODULES = ("pandas", "plotly.express", "plotly.graph_objects", "PIL.ImageDraw", "PIL.ImageFont",
+                    "google.generativeai", "requests")
+
+_PROBE = """
+import json, sys, time
+import streamlit
+before = set(sys.modules)
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{'ms': elapsed * 1000, 'loaded': sorted(set(sys.modules) - before)}}))
+"""
+
+def _run(args, env=None):
+    return subprocess.run([sys.executable, *args], cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+
+def _probe(module):
+    # Importing a page runs its top level in bare mode; streamlit's warnings go to stderr
+    output = _run(["-c", _PROBE.format(module=module)]).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def _top_imports(module, count):
+    """Slowest imports a page adds, by cumulative microseconds from -X importtime"""
+    stderr = _run(["-X", "importtime", "-c", f"import streamlit; import {module}"]).stderr
+    rows = []
+    seen_streamlit = False
+    for line in stderr.splitlines():
+        match = re.match(r"import time:\s+(\d+) \|\s+(\d+) \|(\s+)(\S+)", line)
+        if not match:
+            continue
+        if not seen_streamlit:
+            # Everything up to the top-level streamlit entry is streamlit's own cost
+            seen_streamlit = match.group(4) == "streamlit" and len(match.group(3)) == 1
+            continue
+        rows.append((int(match.group(2)), len(match.group(3)), match.group(4)))
+    top_level = min((depth for _, depth, _ in rows), default=1)
+    return sorted((row for row in rows if row[1] <= top_level + 2), reverse=True)[:count]
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=400.0)
+    parser.add_argument("--top", type=int, default=0, help="also list the N slowest imports per page")
+    args = parser.parse_args()
+
+    failures = []
+    print(f"{'page':<8}{'p50 ms':>9}{'min ms':>9}{'max ms':>9}  deferred modules loaded")
+    for page in PAGES:
+        probes = [_probe(page) for _ in range(args.runs)]
+        timings = sorted(probe['ms'] for probe in probes)
+        loaded = [name for name in DEFERRED_MODULES if name in probes[0]['loaded']]
+        p50 = statistics.median(timings)
+        print(f"{page:<8}{p50:>9.1f}{timings[0]:>9.1f}{timings[-1]:>9.1f}  {', '.join(loaded) or '-'}")
+        if loaded:
+            failures.append(f"{page} imports {', '.join(loaded)} at startup")
+        if p50 > args.budget_ms:
+            failures.append(f"{page} p50 {p50:.1f} ms exceeds {args.budget_ms:.0f} ms budget")
+        for cumulative, _, name in _top_imports(page, args.top) if args.top else []:
+            print(f"    {cumulative / 1000:>8.1f} ms  {name}")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if failures:
+        return 1
+    print(f"OK: every page imports within {args.budget_ms:.0f} ms without deferred modules")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
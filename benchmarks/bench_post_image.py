@@ -0,0 +1,77 @@
+"""Render-time benchmark for post images
+
+Usage: python benchmarks/bench_post_image.py [--runs N] [--budget-ms MS]
+
+Exits non-zero when the cold 1080×1350 median exceeds the budget.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from image_options import IMAGE_SIZES  # noqa: E402
+import post_image  # noqa: E402
+
+SAMPLE_POST = """🏠 Working remotely for 3+ years taught me that productivity isn't about working MORE hours—it's about working SMARTER.
+
+Here are my game-changing strategies:
+
+⏰ Time-blocking over multitasking
+📱 Digital boundaries are non-negotiable
+🚶‍♀️ Micro-breaks = macro results
+🎯 Weekly goal-setting rituals
+
+What's your best remote work tip? Share below! 👇
+
+#RemoteWork #Productivity #WorkLifeBalance"""
+
+def _time_render(size, style, runs, cold):
+    timings = []
+    for i in range(runs):
+        if cold:
+            # Glyph masks and word widths are per-text caches; fonts, gradients and layouts stay warm
+            post_image.line_mask.cache_clear()
+            post_image.text_width.cache_clear()
+            post_image.text_bbox.cache_clear()
+        start = time.perf_counter()
+        post_image.create_post_image(SAMPLE_POST, style, size)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=50)
+    parser.add_argument("--budget-ms", type=float, default=50.0)
+    args = parser.parse_args()
+
+    styles = [name for name in post_image.TEMPLATE_STYLES if name != "professional"]
+    # Warm-up: font loading and gradient rendering happen once per process
+    for size in IMAGE_SIZES.values():
+        for style in styles:
+            post_image.create_post_image(SAMPLE_POST, style, size)
+
+    cold_portrait = None
+    print(f"{'size':<24}{'cache':<7}{'p50 ms':>9}{'p95 ms':>9}{'max ms':>9}")
+    for name, size in IMAGE_SIZES.items():
+        for cold in (True, False):
+            timings = []
+            for style in styles:
+                timings += _time_render(size, style, max(1, args.runs // len(styles)), cold)
+            timings.sort()
+            p50 = statistics.median(timings)
+            p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+            print(f"{name:<24}{'cold' if cold else 'warm':<7}{p50:>9.1f}{p95:>9.1f}{timings[-1]:>9.1f}")
+            if cold and size == (1080, 1350):
+                cold_portrait = p50
+
+    if cold_portrait > args.budget_ms:
+        print(f"FAIL: 1080×1350 cold p50 {cold_portrait:.1f} ms exceeds {args.budget_ms:.0f} ms budget")
+        return 1
+    print(f"OK: 1080×1350 cold p50 {cold_portrait:.1f} ms within {args.budget_ms:.0f} ms budget")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,184 @@
+"""Local stand-in for the Gemini REST endpoint with injectable latency, errors and 429s
+
+Usage: python benchmarks/fake_gemini.py [--port P] [--latency-ms MS] [--jitter-ms MS]
+                                        [--error-rate R] [--throttle-rate R]
+
+Point the app at it with GEMINI_API_ENDPOINT=http://127.0.0.1:P (REST transport). Serves
+generateContent, streamGenerateContent and countTokens for any model name.
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+SAMPLE_POST = ("🚀 Remote work isn't about where you sit—it's about how you work.\n\n"
+               "Three habits that changed my week:\n\n"
+               "⏰ Time-blocking over multitasking\n"
+               "📱 Notifications off during deep work\n"
+               "🎯 One weekly goal, written down\n\n"
+               "What's the habit that works for you? 👇\n\n"
+               "#RemoteWork #Productivity #Leadership")
+
+_PATH_RE = re.compile(r"^/v1beta/(?:models|tunedModels)/([^:/]+):(generateContent|streamGenerateContent|countTokens)")
+
+@dataclass
+class FaultProfile:
+    latency_ms: float = 200.0
+    jitter_ms: float = 50.0
+    # Share of requests answered with 500 and with 429 (RESOURCE_EXHAUSTED)
+    error_rate: float = 0.0
+    throttle_rate: float = 0.0
+    # retryDelay sent with 429s, as the real API does
+    retry_delay_seconds: float = 0.05
+    chunks: int = 4
+
+class FakeGeminiServer(ThreadingHTTPServer):
+    """Threaded HTTP server answering Gemini REST calls with canned posts"""
+    daemon_threads = True
+    # The default backlog of 5 drops connections under load and clients stall on SYN retransmits
+    request_queue_size = 256
+
+    def __init__(self, port: int = 0, profile: Optional[FaultProfile] = None):
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.profile = profile or FaultProfile()
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def endpoint(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def count_request(self) -> int:
+        with self._lock:
+            self.requests += 1
+            return self.requests
+
+    def start(self) -> "FakeGeminiServer":
+        self._thread = threading.Thread(target=self.serve_forever, name="fake-gemini", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+def _usage(prompt_text: str, output_text: str) -> dict:
+    prompt_tokens = max(1, len(prompt_text) // 4)
+    output_tokens = max(1, len(output_text) // 4)
+    return {'promptTokenCount': prompt_tokens, 'candidatesTokenCount': output_tokens,
+            'totalTokenCount': prompt_tokens + output_tokens}
+
+def _response(texts, usage: Optional[dict] = None, finish: bool = True) -> dict:
+    candidates = []
+    for index, text in enumerate(texts):
+        candidate = {'content': {'parts': [{'text': text}], 'role': 'model'}, 'index': index}
+        if finish:
+            candidate['finishReason'] = 'STOP'
+        candidates.append(candidate)
+    body = {'candidates': candidates}
+    if usage is not None:
+        body['usageMetadata'] = usage
+    return body
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: FakeGeminiServer
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, body, headers: Optional[dict] = None) -> None:
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=UTF-8")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _send_error(self, status: int, grpc_status: str, message: str, details=None, headers=None) -> None:
+        self._send_json(status, {'error': {'code': status, 'message': message, 'status': grpc_status,
+                                           'details': details or []}}, headers)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        request = json.loads(self.rfile.read(length) or b"{}")
+        match = _PATH_RE.match(self.path)
+        if match is None:
+            self._send_error(404, "NOT_FOUND", f"Unknown path {self.path}")
+            return
+        method = match.group(2)
+        profile = self.server.profile
+        number = self.server.count_request()
+        prompt_text = json.dumps(request.get('contents', []), ensure_ascii=False)
+
+        if method == "countTokens":
+            self._send_json(200, {'totalTokens': max(1, len(prompt_text) // 4)})
+            return
+
+        time.sleep(max(0.0, random.gauss(profile.latency_ms, profile.jitter_ms)) / 1000)
+        roll = random.random()
+        if roll < profile.throttle_rate:
+            delay = f"{profile.retry_delay_seconds}s"
+            self._send_error(
+                429, "RESOURCE_EXHAUSTED", f"Resource has been exhausted (e.g. check quota). Please retry in {delay}.",
+                [{'@type': 'type.googleapis.com/google.rpc.RetryInfo', 'retryDelay': delay}]
+            )
+            return
+        if roll < profile.throttle_rate + profile.error_rate:
+            self._send_error(500, "INTERNAL", "An internal error has occurred.")
+            return
+
+        count = (request.get('generationConfig') or {}).get('candidateCount') or 1
+        texts = [f"{SAMPLE_POST}\n\n(#{number}.{index})" for index in range(count)]
+        usage = _usage(prompt_text, "".join(texts))
+        if method == "generateContent":
+            self._send_json(200, _response(texts, usage))
+            return
+
+        # REST streaming is one JSON array whose elements arrive as they are written
+        text = texts[0]
+        size = max(1, len(text) // profile.chunks)
+        pieces = [text[i:i + size] for i in range(0, len(text), size)]
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json; charset=UTF-8")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for index, piece in enumerate(pieces):
+            last = index == len(pieces) - 1
+            element = json.dumps(_response([piece], usage if last else None, finish=last))
+            self._write_chunk(("[" if index == 0 else ",") + element + ("]" if last else ""))
+            if not last:
+                time.sleep(profile.latency_ms / 1000 / profile.chunks)
+        self._write_chunk("")
+
+    def _write_chunk(self, text: str) -> None:
+        data = text.encode('utf-8')
+        self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+        self.wfile.flush()
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=200.0)
+    parser.add_argument("--jitter-ms", type=float, default=50.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    server = FakeGeminiServer(args.port, FaultProfile(args.latency_ms, args.jitter_ms, args.error_rate,
+                                                      args.throttle_rate))
+    print(f"Fake Gemini listening on {server.endpoint}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,424 @@
+import asyncio
+import email.utils
+import os
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, AsyncIterator, Awaitable, Callable, Iterator, List, Optional, Tuple
+
+from rate_limiter import RateLimitExceeded, get_rate_limiter, response_token_count
+from tracing import get_tracer, usage_attrs
+
+if TYPE_CHECKING:
+    import google.generativeai as genai
+
+# Retry policy shared by every Gemini call
+MAX_ATTEMPTS = 5
+BASE_DELAY_SECONDS = 1.0
+MAX_DELAY_SECONDS = 30.0
+MAX_RETRY_AFTER_SECONDS = 60.0
+
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+# API clients pooled per key: every model for a key shares one transport
+CLIENT_CACHE_SIZE = 64
+# Models are thin wrappers around a pooled client, one per (API key, model name, system instruction). A key uses
+# at most about 30 (6 templates and main.py's topic posts, 4 hashtag/call-to-action variants each, plus the plain
+# model for token counts and enhancing), so this holds every model for several active keys
+MODEL_CACHE_SIZE = 256
+
+# genai.configure() swaps process-global client state, so model construction is serialized
+_configure_lock = threading.Lock()
+
+def _configure(genai, api_key: str) -> None:
+    # Caller holds _configure_lock. GEMINI_API_ENDPOINT (e.g. benchmarks/fake_gemini.py) means REST to that host
+    endpoint = os.environ.get("GEMINI_API_ENDPOINT")
+    if endpoint:
+        genai.configure(api_key=api_key, transport="rest", client_options={'api_endpoint': endpoint})
+    else:
+        genai.configure(api_key=api_key)
+
+def _rest_transport() -> bool:
+    # The SDK's async REST client awaits a synchronous response (google-generativeai 0.8), so async calls
+    # against a REST endpoint run the sync call on a worker thread instead
+    return bool(os.environ.get("GEMINI_API_ENDPOINT"))
+
+@dataclass
+class CallStats:
+    attempts: int = 0
+    elapsed: float = 0.0
+    errors: List[str] = field(default_factory=list)
+
+    def summary(self) -> str:
+        return f"{self.elapsed:.1f}s, {self.attempts} attempt{'s' if self.attempts != 1 else ''}"
+
+class _Transport:
+    """The sync and async API clients for one key"""
+
+    def __init__(self, client):
+        self.client = client
+        self.async_client = None
+
+_transports: "OrderedDict[str, _Transport]" = OrderedDict()
+
+def _transport(api_key: str) -> _Transport:
+    # Caller holds _configure_lock
+    import google.generativeai as genai
+    from google.generativeai import client as genai_client
+
+    transport = _transports.get(api_key)
+    if transport is None:
+        _configure(genai, api_key)
+        transport = _Transport(genai_client.get_default_generative_client())
+        _transports[api_key] = transport
+        while len(_transports) > CLIENT_CACHE_SIZE:
+            _transports.popitem(last=False)
+    _transports.move_to_end(api_key)
+    return transport
+
+def build_model(api_key: str, model_name: str, system_instruction: Optional[str] = None) -> 'genai.GenerativeModel':
+    """Create a model bound to the pooled API client for api_key"""
+    # The SDK takes about a second to import, so it loads with the first model rather than with the app
+    import google.generativeai as genai
+
+    model = genai.GenerativeModel(model_name, system_instruction=system_instruction)
+    with _configure_lock:
+        transport = _transport(api_key)
+    # Bind the transport now; the SDK would otherwise pick up whatever key was configured last
+    model._client = transport.client
+    model._async_client = transport.async_client
+    return model
+
+_models: "OrderedDict[Tuple[str, str, Optional[str]], genai.GenerativeModel]" = OrderedDict()
+_models_lock = threading.Lock()
+
+def get_model(api_key: str, model_name: str, system_instruction: Optional[str] = None) -> 'genai.GenerativeModel':
+    """Shared model per (API key, model name, system instruction), reused across sessions, reruns and API requests"""
+    key = (api_key, model_name, system_instruction)
+    with _models_lock:
+        model = _models.get(key)
+        if model is not None:
+            _models.move_to_end(key)
+            return model
+    # Built outside the lock: construction is cheap once the key's client exists, and a rare duplicate is harmless
+    model = build_model(api_key, model_name, system_instruction)
+    with _models_lock:
+        model = _models.setdefault(key, model)
+        _models.move_to_end(key)
+        while len(_models) > MODEL_CACHE_SIZE:
+            _models.popitem(last=False)
+    return model
+
+def bind_async_client(api_key: str, model: 'genai.GenerativeModel') -> 'genai.GenerativeModel':
+    """Give a model the async transport shared by api_key's models; call from the event loop that will use it"""
+    if getattr(model, '_async_client', None) is None and not _rest_transport():
+        import google.generativeai as genai
+        from google.generativeai import client as genai_client
+
+        with _configure_lock:
+            transport = _transport(api_key)
+            if transport.async_client is None:
+                _configure(genai, api_key)
+                transport.async_client = genai_client.get_default_generative_async_client()
+            model._async_client = transport.async_client
+    return model
+
+def _status_code(exc: Exception) -> Optional[int]:
+    code = getattr(exc, 'code', None)
+    # google.api_core exceptions expose the HTTP status as an int
+    if isinstance(code, int):
+        return code
+    response = getattr(exc, 'response', None)
+    status = getattr(response, 'status_code', None)
+    return status if isinstance(status, int) else None
+
+def is_retryable(exc: Exception) -> bool:
+    """Whether a failed call is worth repeating (throttling, overload, transient network errors)"""
+    if isinstance(exc, RateLimitExceeded):
+        # The local limiter already waited as long as allowed
+        return False
+    if isinstance(exc, (ConnectionError, TimeoutError)):
+        return True
+    code = _status_code(exc)
+    if code is not None:
+        return code in RETRYABLE_STATUS_CODES
+    name = type(exc).__name__
+    return name in ('ResourceExhausted', 'TooManyRequests', 'ServiceUnavailable', 'InternalServerError',
+                    'GatewayTimeout', 'DeadlineExceeded', 'ConnectionError', 'Timeout', 'ReadTimeout')
+
+def _parse_duration(value) -> Optional[float]:
+    if value is None:
+        return None
+    # protobuf Duration (gRPC RetryInfo.retry_delay)
+    if hasattr(value, 'seconds'):
+        return value.seconds + getattr(value, 'nanos', 0) / 1e9
+    match = re.fullmatch(r'\s*([\d.]+)\s*s?\s*', str(value))
+    return float(match.group(1)) if match else None
+
+def retry_after_seconds(exc: Exception) -> Optional[float]:
+    """Server-requested delay from a Retry-After header, RetryInfo detail or error message"""
+    response = getattr(exc, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if headers is not None and hasattr(headers, 'get'):
+        value = headers.get('Retry-After')
+        if value:
+            seconds = _parse_duration(value)
+            if seconds is not None:
+                return seconds
+            try:
+                retry_at = email.utils.parsedate_to_datetime(value)
+                return max(0.0, retry_at.timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+
+    for detail in getattr(exc, 'details', None) or []:
+        if isinstance(detail, dict):
+            seconds = _parse_duration(detail.get('retryDelay'))
+        else:
+            seconds = _parse_duration(getattr(detail, 'retry_delay', None))
+        if seconds is not None:
+            return seconds
+
+    match = re.search(r'retry in ([\d.]+)\s*s', str(exc), re.IGNORECASE)
+    return float(match.group(1)) if match else None
+
+def backoff_delay(attempt: int, base: float = BASE_DELAY_SECONDS, cap: float = MAX_DELAY_SECONDS) -> float:
+    """Capped exponential backoff with full jitter for the given (1-based) attempt"""
+    return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
+
+def _retry_delay(exc: Exception, attempt: int) -> float:
+    retry_after = retry_after_seconds(exc)
+    if retry_after is not None:
+        return min(retry_after, MAX_RETRY_AFTER_SECONDS)
+    return backoff_delay(attempt)
+
+def call_with_retry(fn: Callable[[], Any], stats: Optional[CallStats] = None, max_attempts: int = MAX_ATTEMPTS,
+                    sleep: Callable[[float], None] = time.sleep) -> Any:
+    """Call fn, retrying retryable errors; attempts and latency are recorded in stats"""
+    stats = stats if stats is not None else CallStats()
+    start = time.perf_counter()
+    try:
+        for attempt in range(1, max_attempts + 1):
+            stats.attempts = attempt
+            try:
+                return fn()
+            except Exception as e:
+                if attempt == max_attempts or not is_retryable(e):
+                    raise
+                stats.errors.append(str(e))
+                sleep(_retry_delay(e, attempt))
+    finally:
+        stats.elapsed = time.perf_counter() - start
+
+async def call_with_retry_async(fn: Callable[[], Awaitable[Any]], stats: Optional[CallStats] = None,
+                                max_attempts: int = MAX_ATTEMPTS) -> Any:
+    """Async call_with_retry; cancelling the caller also cancels any pending backoff"""
+    stats = stats if stats is not None else CallStats()
+    start = time.perf_counter()
+    try:
+        for attempt in range(1, max_attempts + 1):
+            stats.attempts = attempt
+            try:
+                return await fn()
+            except Exception as e:
+                if attempt == max_attempts or not is_retryable(e):
+                    raise
+                stats.errors.append(str(e))
+                await asyncio.sleep(_retry_delay(e, attempt))
+    finally:
+        stats.elapsed = time.perf_counter() - start
+
+def generate_content(api_key: str, model, prompt, stats: Optional[CallStats] = None, **kwargs):
+    """Rate-limited, retried model.generate_content call"""
+    limiter = get_rate_limiter(api_key)
+    prompt_text = prompt if isinstance(prompt, str) else "\n".join(map(str, prompt))
+
+    def attempt():
+        # Every attempt counts against the quota
+        reserved = limiter.reserve(prompt_text)
+        with get_tracer().span("gemini.generate", model=getattr(model, 'model_name', None)) as attrs:
+            response = model.generate_content(prompt, **kwargs)
+            attrs.update(usage_attrs(response))
+        limiter.record_usage(reserved, response_token_count(response))
+        return response
+
+    return call_with_retry(attempt, stats)
+
+def stream_text(api_key: str, model, prompt: str, stats: Optional[CallStats] = None,
+                on_complete: Optional[Callable[[str], None]] = None) -> Iterator[str]:
+    """Rate-limited, retried streaming call yielding the text of each chunk"""
+    stats = stats if stats is not None else CallStats()
+    limiter = get_rate_limiter(api_key)
+    start = time.perf_counter()
+
+    def open_stream():
+        reserved = limiter.reserve(prompt)
+        chunks = iter(model.generate_content(prompt, stream=True))
+        # Request errors surface when the first chunk is read
+        return reserved, next(chunks, None), chunks
+
+    # Spans the whole stream, retries of its opening included
+    with get_tracer().span("gemini.stream", model=getattr(model, 'model_name', None)) as attrs:
+        # Only opening the stream is retried; errors after text has been yielded are raised as-is
+        reserved, chunk, chunks = call_with_retry(open_stream, stats)
+        attrs['first_chunk_ms'] = round((time.perf_counter() - start) * 1000, 1)
+        parts = []
+        last = chunk
+        while chunk is not None:
+            # Chunks without parts (e.g. a trailing finish_reason) carry no text
+            if chunk.parts:
+                parts.append(chunk.text)
+                yield chunk.text
+            last = chunk
+            chunk = next(chunks, None)
+        stats.elapsed = time.perf_counter() - start
+        attrs.update(usage_attrs(last))
+
+    # Usage metadata on the final chunk covers the whole response
+    limiter.record_usage(reserved, response_token_count(last))
+    if on_complete is not None:
+        on_complete("".join(parts))
+
+def candidate_texts(response) -> List[str]:
+    """Text of every candidate in a response that produced any (blocked candidates have no parts)"""
+    texts = []
+    for candidate in getattr(response, 'candidates', None) or []:
+        parts = getattr(getattr(candidate, 'content', None), 'parts', None) or []
+        text = "".join(getattr(part, 'text', '') for part in parts)
+        if text:
+            texts.append(text)
+    return texts
+
+def generate_variants(api_key: str, model, prompt: str, count: int, stats: Optional[CallStats] = None) -> List[str]:
+    """Up to count distinct completions from one candidate_count request, topped up with concurrent calls"""
+    stats = stats if stats is not None else CallStats()
+    start = time.perf_counter()
+    texts: List[str] = []
+    try:
+        response = generate_content(api_key, model, prompt, stats=stats, generation_config={'candidate_count': count})
+        texts = candidate_texts(response)
+    except Exception as e:
+        # Models without multi-candidate support reject the request outright
+        if _status_code(e) != 400 and type(e).__name__ != 'InvalidArgument':
+            raise
+
+    missing = count - len(texts)
+    if missing > 0:
+        call_stats = [CallStats() for _ in range(missing)]
+        with ThreadPoolExecutor(max_workers=missing) as executor:
+            futures = [executor.submit(generate_content, api_key, model, prompt, call_stats[i]) for i in range(missing)]
+        errors = []
+        for future in futures:
+            try:
+                texts.extend(candidate_texts(future.result())[:1])
+            except Exception as e:
+                errors.append(e)
+        for extra in call_stats:
+            stats.attempts += extra.attempts
+            stats.errors.extend(extra.errors)
+        if not texts and errors:
+            raise errors[0]
+    if not texts:
+        raise ValueError("The model returned no usable candidates")
+    stats.elapsed = time.perf_counter() - start
+    return texts[:count]
+
+async def generate_content_async(api_key: str, model, prompt, stats: Optional[CallStats] = None, **kwargs):
+    """Rate-limited, retried model.generate_content_async call"""
+    limiter = get_rate_limiter(api_key)
+    prompt_text = prompt if isinstance(prompt, str) else "\n".join(map(str, prompt))
+    bind_async_client(api_key, model)
+
+    async def attempt():
+        # Waiting for quota sleeps on the event loop, so queued requests hold no threads
+        reserved = await limiter.reserve_async(prompt_text)
+        with get_tracer().span("gemini.generate", model=getattr(model, 'model_name', None)) as attrs:
+            if _rest_transport():
+                response = await asyncio.to_thread(model.generate_content, prompt, **kwargs)
+            else:
+                response = await model.generate_content_async(prompt, **kwargs)
+            attrs.update(usage_attrs(response))
+        limiter.record_usage(reserved, response_token_count(response))
+        return response
+
+    return await call_with_retry_async(attempt, stats)
+
+async def _iterate_in_thread(chunks: Iterator) -> AsyncIterator:
+    """Async iteration over a blocking iterator, reading each item on a worker thread"""
+    while True:
+        chunk = await asyncio.to_thread(next, chunks, None)
+        if chunk is None:
+            return
+        yield chunk
+
+async def stream_text_async(api_key: str, model, prompt: str, stats: Optional[CallStats] = None,
+                            on_chunk: Optional[Callable[[str], None]] = None) -> str:
+    """Rate-limited, retried streaming call; on_chunk receives each chunk's text and the full text is returned"""
+    stats = stats if stats is not None else CallStats()
+    limiter = get_rate_limiter(api_key)
+    bind_async_client(api_key, model)
+    start = time.perf_counter()
+
+    async def open_stream():
+        reserved = await limiter.reserve_async(prompt)
+        if _rest_transport():
+            chunks = await asyncio.to_thread(lambda: iter(model.generate_content(prompt, stream=True)))
+            return reserved, _iterate_in_thread(chunks)
+        # Request errors surface when the first chunk is awaited
+        return reserved, await model.generate_content_async(prompt, stream=True)
+
+    with get_tracer().span("gemini.stream", model=getattr(model, 'model_name', None)) as attrs:
+        reserved, response = await call_with_retry_async(open_stream, stats)
+        parts = []
+        last = None
+        async for chunk in response:
+            if chunk.parts:
+                if not parts:
+                    attrs['first_chunk_ms'] = round((time.perf_counter() - start) * 1000, 1)
+                parts.append(chunk.text)
+                if on_chunk is not None:
+                    on_chunk(chunk.text)
+            last = chunk
+        stats.elapsed = time.perf_counter() - start
+        attrs.update(usage_attrs(last))
+    limiter.record_usage(reserved, response_token_count(last))
+    return "".join(parts)
+
+async def generate_variants_async(api_key: str, model, prompt: str, count: int,
+                                  stats: Optional[CallStats] = None) -> List[str]:
+    """Async generate_variants: one candidate_count request, missing variants requested concurrently"""
+    stats = stats if stats is not None else CallStats()
+    start = time.perf_counter()
+    texts: List[str] = []
+    try:
+        response = await generate_content_async(api_key, model, prompt, stats=stats,
+                                                 generation_config={'candidate_count': count})
+        texts = candidate_texts(response)
+    except Exception as e:
+        if _status_code(e) != 400 and type(e).__name__ != 'InvalidArgument':
+            raise
+
+    missing = count - len(texts)
+    if missing > 0:
+        call_stats = [CallStats() for _ in range(missing)]
+        results = await asyncio.gather(
+            *(generate_content_async(api_key, model, prompt, extra) for extra in call_stats),
+            return_exceptions=True
+        )
+        errors = [result for result in results if isinstance(result, Exception)]
+        for result in results:
+            if not isinstance(result, BaseException):
+                texts.extend(candidate_texts(result)[:1])
+        for extra in call_stats:
+            stats.attempts += extra.attempts
+            stats.errors.extend(extra.errors)
+        if not texts and errors:
+            raise errors[0]
+    if not texts:
+        raise ValueError("The model returned no usable candidates")
+    stats.elapsed = time.perf_counter() - start
+    return texts[:count]
@@ -0,0 +1,125 @@
+import asyncio
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from gemini_client import CallStats
+
+# Finished requests kept for polling before the oldest are dropped
+MAX_FINISHED_REQUESTS = 256
+
+PENDING, RUNNING, DONE, FAILED, CANCELLED = "pending", "running", "done", "failed", "cancelled"
+
+@dataclass
+class GenerationRequest:
+    id: str
+    owner: str
+    key: Optional[str] = None
+    state: str = PENDING
+    # Text streamed so far, for progress display
+    chunks: List[str] = field(default_factory=list)
+    result: Any = None
+    error: Optional[str] = None
+    stats: CallStats = field(default_factory=CallStats)
+    created: float = field(default_factory=time.perf_counter)
+    started: Optional[float] = None
+    finished: Optional[float] = None
+    _future: Optional[Future] = field(default=None, repr=False)
+
+    @property
+    def partial_text(self) -> str:
+        return "".join(self.chunks)
+
+    @property
+    def done(self) -> bool:
+        return self.state in (DONE, FAILED, CANCELLED)
+
+class GenerationService:
+    """Runs generation coroutines on a background event loop, one in-flight request per owner
+
+    Submitting a new request for an owner (a browser session) cancels the one it supersedes,
+    so repeated clicks never stack up API calls. Callers poll requests by id.
+    """
+
+    def __init__(self):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="generation-service", daemon=True)
+        self._thread.start()
+        self._lock = threading.Lock()
+        self._requests: Dict[str, GenerationRequest] = {}
+        self._active: Dict[str, str] = {}
+
+    def submit(self, owner: str, job: Callable[[GenerationRequest], Awaitable[Any]],
+               key: Optional[str] = None) -> GenerationRequest:
+        """Start job for owner, cancelling the owner's previous request unless it is the same (by key) and live"""
+        request = GenerationRequest(id=uuid.uuid4().hex[:12], owner=owner, key=key)
+
+        async def run():
+            request.state = RUNNING
+            request.started = time.perf_counter()
+            try:
+                request.result = await job(request)
+                request.state = DONE
+            except asyncio.CancelledError:
+                request.state = CANCELLED
+                raise
+            except Exception as e:
+                request.error = str(e)
+                request.state = FAILED
+            finally:
+                request.finished = time.perf_counter()
+
+        with self._lock:
+            previous = self._requests.get(self._active.get(owner, ""))
+            if previous is not None and not previous.done:
+                if key is not None and previous.key == key:
+                    return previous
+                previous._future.cancel()
+            request._future = asyncio.run_coroutine_threadsafe(run(), self._loop)
+            # Cancelled before the coroutine ever started
+            request._future.add_done_callback(lambda future: self._mark_cancelled(request, future))
+            self._requests[request.id] = request
+            self._active[owner] = request.id
+            self._prune()
+        return request
+
+    @staticmethod
+    def _mark_cancelled(request: GenerationRequest, future: Future) -> None:
+        if future.cancelled() and not request.done:
+            request.state = CANCELLED
+            request.finished = time.perf_counter()
+
+    def get(self, request_id: Optional[str]) -> Optional[GenerationRequest]:
+        with self._lock:
+            return self._requests.get(request_id or "")
+
+    def cancel(self, request_id: str) -> bool:
+        request = self.get(request_id)
+        if request is None or request.done:
+            return False
+        return request._future.cancel()
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return sum(not request.done for request in self._requests.values())
+
+    def _prune(self) -> None:
+        finished = [request for request in self._requests.values() if request.done]
+        for request in finished[:max(0, len(finished) - MAX_FINISHED_REQUESTS)]:
+            del self._requests[request.id]
+            if self._active.get(request.owner) == request.id:
+                del self._active[request.owner]
+
+_default_service: Optional[GenerationService] = None
+_default_service_lock = threading.Lock()
+
+def get_generation_service() -> GenerationService:
+    """Process-wide generation service shared by every session"""
+    global _default_service
+    with _default_service_lock:
+        if _default_service is None:
+            _default_service = GenerationService()
+        return _default_service
@@ -0,0 +1,281 @@
+import datetime
+import json
+import os
+import sqlite3
+import threading
+from typing import Dict, List, Optional
+
+from post_metrics import calculate_post_metrics
+
+DEFAULT_DB_PATH = os.environ.get("POST_HISTORY_DB", os.path.join(".data", "post_history.sqlite3"))
+# Opt-in for deployments where every visitor should see (and may delete) every post, e.g. a team-internal
+# instance; by default each owner only ever sees their own posts
+SHARED_HISTORY = os.environ.get("POST_HISTORY_SHARED", "").lower() in ('1', 'true', 'yes')
+# Owner of every post when history is shared, and of posts saved before posts had owners (schema version 2)
+SHARED_OWNER = ""
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS posts (
+    id INTEGER PRIMARY KEY,
+    timestamp TEXT NOT NULL,
+    template TEXT NOT NULL,
+    content TEXT NOT NULL,
+    settings TEXT NOT NULL DEFAULT '{}',
+    input TEXT NOT NULL DEFAULT ''
+);
+"""
+
+# Every query filters by owner first (schema version 2)
+_OWNER_INDEXES = """
+DROP INDEX IF EXISTS idx_posts_timestamp;
+DROP INDEX IF EXISTS idx_posts_template;
+CREATE INDEX IF NOT EXISTS idx_posts_owner ON posts(owner, timestamp);
+CREATE INDEX IF NOT EXISTS idx_posts_owner_template ON posts(owner, template, timestamp);
+"""
+
+# External-content FTS5 index kept in sync with posts by triggers
+_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS posts_fts USING fts5(content, content='posts', content_rowid='id');
+CREATE TRIGGER IF NOT EXISTS posts_ai AFTER INSERT ON posts BEGIN
+    INSERT INTO posts_fts(rowid, content) VALUES (new.id, new.content);
+END;
+CREATE TRIGGER IF NOT EXISTS posts_ad AFTER DELETE ON posts BEGIN
+    INSERT INTO posts_fts(posts_fts, rowid, content) VALUES ('delete', old.id, old.content);
+END;
+CREATE TRIGGER IF NOT EXISTS posts_au AFTER UPDATE OF content ON posts BEGIN
+    INSERT INTO posts_fts(posts_fts, rowid, content) VALUES ('delete', old.id, old.content);
+    INSERT INTO posts_fts(rowid, content) VALUES (new.id, new.content);
+END;
+"""
+
+# Metrics precomputed at insert time so listings never need post bodies (schema version 1)
+_METRIC_COLUMNS = {
+    'character_count': "INTEGER NOT NULL DEFAULT 0",
+    'word_count': "INTEGER NOT NULL DEFAULT 0",
+    'hashtag_count': "INTEGER NOT NULL DEFAULT 0",
+    'engagement_score': "REAL NOT NULL DEFAULT 0",
+    'readability': "TEXT NOT NULL DEFAULT ''"
+}
+SCHEMA_VERSION = 2
+
+_COLUMNS = "id, timestamp, template, content, settings, input"
+_SUMMARY_COLUMNS = "id, timestamp, template, substr(content, 1, ?), " + ", ".join(_METRIC_COLUMNS)
+
+def _fts_query(query: str) -> str:
+    # Quote every term so user input is matched literally rather than parsed as FTS syntax
+    return " ".join('"' + term.replace('"', '""') + '"' for term in query.split())
+
+class PostHistoryStore:
+    """SQLite-backed post history with timestamp/template indexes and full-text search"""
+
+    def __init__(self, path: str = DEFAULT_DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._migrate()
+        try:
+            self._conn.executescript(_FTS_SCHEMA)
+            self.has_fts = True
+        except sqlite3.OperationalError:
+            # SQLite builds without FTS5 fall back to LIKE scans
+            self.has_fts = False
+
+    def _migrate(self) -> None:
+        version = self._conn.execute("PRAGMA user_version").fetchone()[0]
+        if version >= SCHEMA_VERSION:
+            return
+        existing = {row[1] for row in self._conn.execute("PRAGMA table_info(posts)")}
+        self._conn.execute("BEGIN")
+        if version < 1:
+            for column, definition in _METRIC_COLUMNS.items():
+                if column not in existing:
+                    self._conn.execute(f"ALTER TABLE posts ADD COLUMN {column} {definition}")
+            # Backfill metrics for posts stored before the columns existed
+            rows = self._conn.execute("SELECT id, content FROM posts").fetchall()
+            self._conn.executemany(
+                "UPDATE posts SET character_count = ?, word_count = ?, hashtag_count = ?, engagement_score = ?, "
+                "readability = ? WHERE id = ?",
+                [self._metric_values(content) + (post_id,) for post_id, content in rows]
+            )
+        if version < 2:
+            if 'owner' not in existing:
+                # Posts from before owners existed stay visible only when history is shared
+                self._conn.execute(f"ALTER TABLE posts ADD COLUMN owner TEXT NOT NULL DEFAULT '{SHARED_OWNER}'")
+            for statement in _OWNER_INDEXES.strip().splitlines():
+                self._conn.execute(statement)
+        self._conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self._conn.execute("COMMIT")
+
+    @staticmethod
+    def _metric_values(content: str) -> tuple:
+        metrics = calculate_post_metrics(content)
+        return (metrics.character_count, metrics.word_count, metrics.hashtag_count,
+                metrics.engagement_score, metrics.readability_score)
+
+    @staticmethod
+    def _row_to_summary(row) -> Dict:
+        post_id, timestamp, template, preview = row[:4]
+        summary = {
+            'id': post_id,
+            'timestamp': datetime.datetime.fromisoformat(timestamp),
+            'template': template,
+            'preview': preview
+        }
+        summary.update(zip(_METRIC_COLUMNS, row[4:]))
+        return summary
+
+    @staticmethod
+    def _row_to_post(row) -> Dict:
+        post_id, timestamp, template, content, settings, user_input = row
+        return {
+            'id': post_id,
+            'timestamp': datetime.datetime.fromisoformat(timestamp),
+            'template': template,
+            'content': content,
+            'settings': json.loads(settings),
+            'input': user_input
+        }
+
+    def add(self, owner: str, post: Dict) -> int:
+        """Insert a post for owner and return its id"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO posts (owner, timestamp, template, content, settings, input, "
+                f"{', '.join(_METRIC_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    owner,
+                    post['timestamp'].isoformat(),
+                    post['template'],
+                    post['content'],
+                    json.dumps(post.get('settings', {})),
+                    post.get('input', '')
+                ) + self._metric_values(post['content'])
+            )
+            return cursor.lastrowid
+
+    def get(self, owner: str, post_id: int) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(f"SELECT {_COLUMNS} FROM posts WHERE id = ? AND owner = ?",
+                                     (post_id, owner)).fetchone()
+        return self._row_to_post(row) if row else None
+
+    def update_content(self, owner: str, post_id: int, content: str) -> None:
+        """Replace a post's text (and its stored metrics), keeping its id and timestamp"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE posts SET content = ?, character_count = ?, word_count = ?, hashtag_count = ?, "
+                "engagement_score = ?, readability = ? WHERE id = ? AND owner = ?",
+                (content,) + self._metric_values(content) + (post_id, owner)
+            )
+
+    def delete(self, owner: str, post_id: int) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM posts WHERE id = ? AND owner = ?", (post_id, owner))
+
+    def _filters(self, owner: str, template: Optional[str], query: Optional[str]):
+        clauses, params = ["owner = ?"], [owner]
+        if template:
+            clauses.append("template = ?")
+            params.append(template)
+        if query and query.strip():
+            if self.has_fts:
+                clauses.append("id IN (SELECT rowid FROM posts_fts WHERE posts_fts MATCH ?)")
+                params.append(_fts_query(query))
+            else:
+                clauses.append("content LIKE ?")
+                params.append(f"%{query.strip()}%")
+        return f"WHERE {' AND '.join(clauses)}", params
+
+    def count(self, owner: str, template: Optional[str] = None, query: Optional[str] = None) -> int:
+        where, params = self._filters(owner, template, query)
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM posts {where}", params).fetchone()[0]
+
+    def list(self, owner: str, offset: int = 0, limit: Optional[int] = None, template: Optional[str] = None,
+             query: Optional[str] = None) -> List[Dict]:
+        """Page of owner's posts, newest first, optionally filtered by template and full-text query"""
+        where, params = self._filters(owner, template, query)
+        sql = f"SELECT {_COLUMNS} FROM posts {where} ORDER BY timestamp DESC, id DESC LIMIT ? OFFSET ?"
+        with self._lock:
+            rows = self._conn.execute(sql, params + [-1 if limit is None else limit, offset]).fetchall()
+        return [self._row_to_post(row) for row in rows]
+
+    def list_summaries(self, owner: str, offset: int = 0, limit: int = 25, template: Optional[str] = None,
+                       query: Optional[str] = None, preview_chars: int = 120) -> List[Dict]:
+        """Like list(), but returns a content preview and stored metrics instead of full bodies"""
+        where, params = self._filters(owner, template, query)
+        sql = (f"SELECT {_SUMMARY_COLUMNS} FROM posts {where} "
+               "ORDER BY timestamp DESC, id DESC LIMIT ? OFFSET ?")
+        with self._lock:
+            rows = self._conn.execute(sql, [preview_chars] + params + [limit, offset]).fetchall()
+        return [self._row_to_summary(row) for row in rows]
+
+    def posts_after(self, owner: str, post_id: int) -> List[Dict]:
+        """Owner's posts inserted after post_id, oldest first (for incremental consumers)"""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {_COLUMNS} FROM posts WHERE owner = ? AND id > ? ORDER BY id", (owner, post_id)
+            ).fetchall()
+        return [self._row_to_post(row) for row in rows]
+
+    def templates(self, owner: str) -> List[str]:
+        with self._lock:
+            return [row[0] for row in self._conn.execute(
+                "SELECT DISTINCT template FROM posts WHERE owner = ? ORDER BY template", (owner,)
+            )]
+
+    def for_owner(self, owner: str) -> "OwnerHistory":
+        return OwnerHistory(self, SHARED_OWNER if SHARED_HISTORY else owner)
+
+class OwnerHistory:
+    """One owner's posts in a PostHistoryStore; every read, search and delete is limited to them"""
+
+    def __init__(self, store: PostHistoryStore, owner: str):
+        self.store = store
+        self.owner = owner
+
+    def add(self, post: Dict) -> int:
+        return self.store.add(self.owner, post)
+
+    def get(self, post_id: int) -> Optional[Dict]:
+        return self.store.get(self.owner, post_id)
+
+    def update_content(self, post_id: int, content: str) -> None:
+        self.store.update_content(self.owner, post_id, content)
+
+    def delete(self, post_id: int) -> None:
+        self.store.delete(self.owner, post_id)
+
+    def count(self, template: Optional[str] = None, query: Optional[str] = None) -> int:
+        return self.store.count(self.owner, template, query)
+
+    def list(self, offset: int = 0, limit: Optional[int] = None, template: Optional[str] = None,
+             query: Optional[str] = None) -> List[Dict]:
+        return self.store.list(self.owner, offset, limit, template, query)
+
+    def list_summaries(self, offset: int = 0, limit: int = 25, template: Optional[str] = None,
+                       query: Optional[str] = None, preview_chars: int = 120) -> List[Dict]:
+        return self.store.list_summaries(self.owner, offset, limit, template, query, preview_chars)
+
+    def posts_after(self, post_id: int) -> List[Dict]:
+        return self.store.posts_after(self.owner, post_id)
+
+    def templates(self) -> List[str]:
+        return self.store.templates(self.owner)
+
+_default_store: Optional[PostHistoryStore] = None
+_default_store_lock = threading.Lock()
+
+def get_history_store() -> PostHistoryStore:
+    """Process-wide history store; sessions read and write it through for_owner()"""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = PostHistoryStore()
+        return _default_store
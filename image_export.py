@@ -0,0 +1,111 @@
+import io
+import multiprocessing
+import os
+import threading
+import zipfile
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from image_options import DEFAULT_QUALITY, DEFAULT_SIZE, EXPORT_FORMATS
+from post_image import create_post_image
+from tracing import get_tracer
+
+EXPORT_WORKERS = min(4, os.cpu_count() or 1)
+
+def encode_image(image, export_format: str, quality: int = DEFAULT_QUALITY) -> bytes:
+    """Encode a rendered image with the optimized settings for export_format"""
+    options = dict(EXPORT_FORMATS[export_format])
+    options.pop('extension')
+    if options.pop('lossy', False):
+        options['quality'] = quality
+    with get_tracer().span("image.encode", format=export_format) as attrs:
+        buffer = io.BytesIO()
+        image.save(buffer, **options)
+        attrs['bytes'] = buffer.tell()
+    return buffer.getvalue()
+
+def export_filename(prefix: str, size: Tuple[int, int], export_format: str) -> str:
+    return f"{prefix}_{size[0]}x{size[1]}.{EXPORT_FORMATS[export_format]['extension']}"
+
+def render_and_encode(text: str, template_style: str = "professional", size: Tuple[int, int] = DEFAULT_SIZE,
+                      export_format: str = "PNG", quality: int = DEFAULT_QUALITY) -> bytes:
+    """Render a post image and encode it; picklable, so it also runs in export pool workers"""
+    return encode_image(create_post_image(text, template_style, size), export_format, quality)
+
+@dataclass
+class ExportJob:
+    """Images being rendered and encoded on the export pool, one future per file name"""
+    prefix: str
+    futures: Dict[str, Future] = field(default_factory=dict)
+    _zip: Optional[bytes] = field(default=None, repr=False)
+
+    @property
+    def completed(self) -> int:
+        return sum(future.done() for future in self.futures.values())
+
+    def done(self) -> bool:
+        return all(future.done() for future in self.futures.values())
+
+    def errors(self) -> List[str]:
+        # Futures are also cancelled from outside, when a broken shared pool is replaced
+        errors = []
+        for name, future in self.futures.items():
+            if future.cancelled():
+                errors.append(f"{name}: cancelled")
+            elif future.done() and future.exception() is not None:
+                errors.append(f"{name}: {future.exception()}")
+        return errors
+
+    def cancel(self) -> None:
+        for future in self.futures.values():
+            future.cancel()
+
+    def zip_bytes(self) -> bytes:
+        """ZIP of every successfully exported file (blocks until the job is done; built once)"""
+        if self._zip is not None:
+            return self._zip
+        buffer = io.BytesIO()
+        # Images are already compressed; storing them avoids a second pointless deflate pass
+        with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_STORED) as archive:
+            for name, future in self.futures.items():
+                if not future.cancelled() and future.exception() is None:
+                    archive.writestr(name, future.result())
+        self._zip = buffer.getvalue()
+        return self._zip
+
+_export_pool: Optional[ProcessPoolExecutor] = None
+_export_pool_lock = threading.Lock()
+
+def get_export_pool(replace_broken: Optional[ProcessPoolExecutor] = None) -> ProcessPoolExecutor:
+    """Process-wide pool for image rendering and encoding"""
+    global _export_pool
+    with _export_pool_lock:
+        if _export_pool is not None and _export_pool is replace_broken:
+            # A worker died (e.g. killed for memory); later exports get a fresh pool
+            _export_pool.shutdown(wait=False, cancel_futures=True)
+            _export_pool = None
+        if _export_pool is None:
+            # Spawned workers: forking a multi-threaded server process can deadlock
+            _export_pool = ProcessPoolExecutor(max_workers=EXPORT_WORKERS,
+                                               mp_context=multiprocessing.get_context('spawn'))
+        return _export_pool
+
+def start_export(text: str, template_style: str, sizes: Sequence[Tuple[int, int]],
+                 formats: Sequence[str], quality: int = DEFAULT_QUALITY,
+                 prefix: str = "linkedin_post_image") -> ExportJob:
+    """Submit one render-and-encode task per size and format without waiting for them"""
+    pool = get_export_pool()
+    job = ExportJob(prefix=prefix)
+    try:
+        for size in sizes:
+            for export_format in formats:
+                name = export_filename(prefix, size, export_format)
+                job.futures[name] = pool.submit(render_and_encode, text, template_style, tuple(size),
+                                                export_format, quality)
+    except BrokenProcessPool:
+        job.cancel()
+        get_export_pool(replace_broken=pool)
+        return start_export(text, template_style, sizes, formats, quality, prefix)
+    return job
@@ -0,0 +1,19 @@
+from typing import Dict, Tuple
+
+# Sizes and export formats offered in the UI; kept free of Pillow so pages can list them without loading it
+
+# LinkedIn's standard image sizes
+IMAGE_SIZES: Dict[str, Tuple[int, int]] = {
+    "Landscape (1200×630)": (1200, 630),
+    "Square (1080×1080)": (1080, 1080),
+    "Portrait (1080×1350)": (1080, 1350),
+}
+DEFAULT_SIZE = IMAGE_SIZES["Landscape (1200×630)"]
+
+# Encoder settings per export format; quality applies to the lossy formats
+EXPORT_FORMATS: Dict[str, Dict] = {
+    "PNG": {'format': 'PNG', 'extension': 'png', 'optimize': True},
+    "JPEG": {'format': 'JPEG', 'extension': 'jpg', 'optimize': True, 'progressive': True, 'lossy': True},
+    "WebP": {'format': 'WEBP', 'extension': 'webp', 'method': 4, 'lossy': True},
+}
+DEFAULT_QUALITY = 85
@@ -1,11 +1,11 @@
 import streamlit as st
-import google.generativeai as genai
-import requests
-from PIL import Image
-import io
-import base64
-import json
-import time
+from image_options import IMAGE_SIZES
+from pipeline import GenerationPipeline
+from post_generator import TEXT_MODEL
+from post_metrics import calculate_post_metrics
+from prompts import MAX_INPUT_TOKENS, build_topic_request
+from rate_limiter import get_rate_limiter
+from gemini_client import CallStats, generate_content, get_model, stream_text
 
 # Page configuration
 st.set_page_config(
@@ -101,11 +101,13 @@ with st.sidebar:
     include_hashtags = st.checkbox("Include Hashtags", value=True)
     include_cta = st.checkbox("Include Call-to-Action", value=True)
     generate_image = st.checkbox("Generate Accompanying Image", value=True)
+    if generate_image:
+        image_size_name = st.selectbox("Image Size", list(IMAGE_SIZES.keys()))
+    stream_output = st.checkbox("Stream Output", value=True, help="Show the post as it is being written")
 
 # Main content area
 if api_key:
-    # Configure the API
-    genai.configure(api_key=api_key)
+    limiter = get_rate_limiter(api_key)
     
     # Initialize session state
     if 'generated_post' not in st.session_state:
@@ -133,12 +135,16 @@ if api_key:
                 "Additional context (optional):",
                 placeholder="Any specific points you want to include or your perspective on the topic..."
             )
+            base_prompt = f"Topic: {topic}"
+            if additional_context:
+                base_prompt += f"\nContext: {additional_context}"
             
         elif input_method == "Key Points":
             key_points = st.text_area(
                 "Enter key points (one per line):",
                 placeholder="• First important point\n• Second key insight\n• Third takeaway\n• Conclusion or action item"
             )
+            base_prompt = f"Key points to cover:\n{key_points}"
             
         else:  # Article Summary
             article_url = st.text_input("Article URL (optional):")
@@ -146,79 +152,71 @@ if api_key:
                 "Article summary or key insights:",
                 placeholder="Summarize the main points of the article you want to discuss..."
             )
+            base_prompt = f"Article insights: {article_summary}"
+            if article_url:
+                base_prompt += f"\nSource: {article_url}"
+        
+        # Long input is shortened before it is sent; the warning reflects the prompt that is actually sent
+        system_instruction, content_prompt, input_truncated = build_topic_request(
+            base_prompt, post_tone, post_length, include_hashtags, include_cta
+        )
+        if input_truncated:
+            st.warning(f"⚠️ Your input is longer than about {MAX_INPUT_TOKENS:,} tokens and will be shortened "
+                       "before sending.")
         
         # Generate button
-        if st.button("🚀 Generate LinkedIn Post", key="generate_btn"):
+        generate_clicked = st.button("🚀 Generate LinkedIn Post", key="generate_btn")
+        stream_placeholder = st.empty()
+        if generate_clicked:
             if ((input_method == "Topic/Idea" and topic) or 
                 (input_method == "Key Points" and key_points) or 
                 (input_method == "Article Summary" and article_summary)):
                 
                 with st.spinner("🤖 AI is crafting your LinkedIn post..."):
                     try:
-                        # Prepare the prompt based on input method
-                        if input_method == "Topic/Idea":
-                            base_prompt = f"Topic: {topic}"
-                            if additional_context:
-                                base_prompt += f"\nContext: {additional_context}"
-                        elif input_method == "Key Points":
-                            base_prompt = f"Key points to cover:\n{key_points}"
-                        else:
-                            base_prompt = f"Article insights: {article_summary}"
-                            if article_url:
-                                base_prompt += f"\nSource: {article_url}"
-                        
-                        # Create comprehensive prompt for content generation
-                        content_prompt = f"""
-                        Create an engaging LinkedIn post based on the following:
-                        
-                        {base_prompt}
-                        
-                        Requirements:
-                        - Tone: {post_tone}
-                        - Length: {post_length}
-                        - Target audience: LinkedIn professionals
-                        - Make it engaging and valuable
-                        - Use line breaks for readability
-                        - Start with a hook to grab attention
-                        {'- Include 5-8 relevant hashtags at the end' if include_hashtags else '- Do not include hashtags'}
-                        {'- Include a clear call-to-action' if include_cta else '- Do not include call-to-action'}
-                        
-                        Format the post to be ready for LinkedIn posting.
-                        """
+                        # The card shows the user's own topic or points, so it renders locally while the text streams
+                        pipeline = GenerationPipeline()
+                        if generate_image:
+                            if input_method == "Topic/Idea":
+                                card_text = f"{topic}\n{additional_context}"
+                            elif input_method == "Key Points":
+                                card_text = key_points
+                            else:
+                                card_text = article_summary
+                            from image_export import render_and_encode
+                            pipeline.submit("image", render_and_encode, card_text, size=IMAGE_SIZES[image_size_name])
                         
                         # Generate content using Gemini
-                        model = genai.GenerativeModel('gemini-1.5-flash')
-                        response = model.generate_content(content_prompt)
-                        st.session_state.generated_post = response.text
+                        model = get_model(api_key, TEXT_MODEL, system_instruction)
+                        call_stats = CallStats()
+                        with pipeline.stage("text"):
+                            if stream_output:
+                                # Render partial text as chunks arrive
+                                post_text = ""
+                                for chunk in stream_text(api_key, model, content_prompt, stats=call_stats):
+                                    post_text += chunk
+                                    stream_placeholder.markdown(post_text + "▌")
+                                stream_placeholder.empty()
+                            else:
+                                post_text = generate_content(api_key, model, content_prompt, stats=call_stats).text
+                        st.session_state.generated_post = post_text
+                        st.session_state.pop("post_editor", None)
+                        # Warms the metrics cache the post preview reads
+                        pipeline.submit("metrics", calculate_post_metrics, post_text)
                         
-                        # Generate image if requested
+                        st.session_state.generated_image = None
                         if generate_image:
-                            with st.spinner("🎨 Creating accompanying image..."):
-                                # Create image prompt
-                                image_prompt = f"""
-                                Create a professional, clean, and modern image for a LinkedIn post about: {topic if input_method == 'Topic/Idea' else 'professional development'}. 
-                                Style: Professional, clean, modern, suitable for LinkedIn
-                                Colors: Use LinkedIn brand colors (blue tones) or professional color palette
-                                Include: Subtle geometric shapes, clean typography space, professional aesthetic
-                                Avoid: Cluttered design, too much text, unprofessional elements
-                                """
-                                
-                                try:
-                                    # Using Gemini's image generation capability
-                                    image_model = genai.GenerativeModel('gemini-1.5-pro')
-                                    image_response = image_model.generate_content([
-                                        f"Generate a professional LinkedIn post image: {image_prompt}",
-                                        "Make it visually appealing and professional"
-                                    ])
-                                    
-                                    # Note: Gemini doesn't directly generate images, so we'll create a placeholder
-                                    # In a real implementation, you'd use DALL-E, Midjourney API, or similar
-                                    st.info("📸 Image generation placeholder - integrate with your preferred image generation service")
-                                    
-                                except Exception as e:
-                                    st.warning(f"Image generation not available: {str(e)}")
+                            try:
+                                st.session_state.generated_image = pipeline.result("image")
+                            except Exception as e:
+                                st.warning(f"Image generation failed: {str(e)}")
+                        pipeline.result("metrics")
                         
                         st.success("✅ Post generated successfully!")
+                        st.caption(f"⏱️ Gemini call: {call_stats.summary()}")
+                        st.caption(f"🧩 Pipeline: {pipeline.summary()}")
+                        with st.expander("⏱️ Stage Timings"):
+                            st.dataframe(pipeline.timing_rows(), hide_index=True, width="stretch")
                         
                     except Exception as e:
                         st.error(f"❌ Error generating post: {str(e)}")
@@ -237,6 +235,15 @@ if api_key:
         - ✅ Completely free
         """)
         
+        # Remaining client-side budget for this API key
+        quota = limiter.status()
+        st.markdown(f"""
+        **Remaining Budget:**
+        - 🔋 {quota.requests_minute} requests this minute
+        - 🔋 {quota.requests_day} requests today
+        - 🔋 {quota.tokens_minute:,} tokens this minute
+        """)
+        
         # Tips
         st.header("💡 Pro Tips")
         st.markdown("""
@@ -274,9 +281,13 @@ if api_key:
         <div class="post-container">
         """, unsafe_allow_html=True)
         
-        # Character count
-        char_count = len(st.session_state.generated_post)
-        st.caption(f"Character count: {char_count} {'(Good for LinkedIn)' if char_count <= 3000 else '(Consider shortening)'}")
+        # Character count and quick metrics
+        metrics = calculate_post_metrics(st.session_state.generated_post)
+        char_count = metrics.character_count
+        st.caption(
+            f"Character count: {char_count} {'(Good for LinkedIn)' if char_count <= 3000 else '(Consider shortening)'}"
+            f" · Engagement: {metrics.engagement_score:.1f}/10 · Readability: {metrics.readability_score}"
+        )
         
         # Editable post content
         edited_post = st.text_area(
@@ -288,8 +299,18 @@ if api_key:
         
         st.markdown("</div>", unsafe_allow_html=True)
         
+        if st.session_state.generated_image:
+            st.image(st.session_state.generated_image, caption="Accompanying Image", width="stretch")
+            st.download_button(
+                label="📥 Download Image",
+                data=st.session_state.generated_image,
+                file_name="linkedin_post_image.png",
+                mime="image/png"
+            )
+        
         # Action buttons
         col1, col2, col3, col4 = st.columns(4)
+        enhance_placeholder = st.empty()
         
         with col1:
             if st.button("📋 Copy to Clipboard"):
@@ -299,6 +320,7 @@ if api_key:
         with col2:
             if st.button("🔄 Regenerate"):
                 st.session_state.generated_post = ""
+                st.session_state.generated_image = None
                 st.rerun()
         
         with col3:
@@ -327,9 +349,16 @@ if api_key:
                         - Maintain professional tone
                         """
                         
-                        model = genai.GenerativeModel('gemini-1.5-flash')
-                        enhanced_response = model.generate_content(enhance_prompt)
-                        st.session_state.generated_post = enhanced_response.text
+                        model = get_model(api_key, TEXT_MODEL)
+                        if stream_output:
+                            enhanced_text = ""
+                            for chunk in stream_text(api_key, model, enhance_prompt):
+                                enhanced_text += chunk
+                                enhance_placeholder.markdown(enhanced_text + "▌")
+                        else:
+                            enhanced_text = generate_content(api_key, model, enhance_prompt).text
+                        st.session_state.generated_post = enhanced_text
+                        st.session_state.pop("post_editor", None)
                         st.rerun()
                     except Exception as e:
                         st.error(f"Error enhancing post: {str(e)}")
@@ -352,7 +381,7 @@ else:
     
     ### ✨ Features:
     - 🤖 AI-powered content generation
-    - 🎨 Professional image suggestions  
+    - 🎨 Branded post images  
     - 📊 Multiple post formats and tones
     - 💡 Built-in templates and tips
     - 📱 Ready-to-post formatting
@@ -0,0 +1,107 @@
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+PIPELINE_WORKERS = 4
+
+@dataclass
+class StageTiming:
+    name: str
+    start: float
+    duration: float
+    error: Optional[str] = None
+
+class GenerationPipeline:
+    """Stages of one generation: background stages overlap while the script thread streams text
+
+    Each stage is submitted once its inputs exist, so dependencies follow from call order.
+    Stage timings are recorded relative to the pipeline start.
+    """
+
+    def __init__(self, executor: Optional[ThreadPoolExecutor] = None, start: Optional[float] = None):
+        self._executor = executor or get_pipeline_executor()
+        # perf_counter time the pipeline counts from, e.g. when an earlier stage was queued elsewhere
+        self._start = start if start is not None else time.perf_counter()
+        self._futures: Dict[str, Future] = {}
+        self._timings: Dict[str, StageTiming] = {}
+        self._lock = threading.Lock()
+
+    def _record(self, name: str, started: float, error: Optional[BaseException] = None) -> None:
+        timing = StageTiming(name, started - self._start, time.perf_counter() - started,
+                             str(error) if error is not None else None)
+        with self._lock:
+            self._timings[name] = timing
+
+    def record_stage(self, name: str, started: float, finished: float) -> None:
+        """Record a stage that ran elsewhere, from its perf_counter start and end"""
+        with self._lock:
+            self._timings[name] = StageTiming(name, started - self._start, finished - started)
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Time a stage that runs inline on the calling thread"""
+        started = time.perf_counter()
+        try:
+            yield
+        except BaseException as e:
+            self._record(name, started, e)
+            raise
+        self._record(name, started)
+
+    def submit(self, name: str, fn: Callable[..., Any], *args, **kwargs) -> Future:
+        """Run a stage on the shared pool"""
+        def run():
+            started = time.perf_counter()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                self._record(name, started, e)
+                raise
+            self._record(name, started)
+            return result
+
+        future = self._executor.submit(run)
+        self._futures[name] = future
+        return future
+
+    def result(self, name: str, timeout: Optional[float] = None) -> Any:
+        return self._futures[name].result(timeout)
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self._start
+
+    def timings(self) -> List[StageTiming]:
+        with self._lock:
+            return sorted(self._timings.values(), key=lambda timing: timing.start)
+
+    def timing_rows(self) -> List[Dict]:
+        """Per-stage breakdown in milliseconds, for display"""
+        return [{
+            'Stage': timing.name,
+            'Start (ms)': round(timing.start * 1000),
+            'Duration (ms)': round(timing.duration * 1000),
+            'Status': 'failed' if timing.error else 'ok'
+        } for timing in self.timings()]
+
+    def summary(self) -> str:
+        timings = self.timings()
+        if not timings:
+            return "no stages"
+        wall = max(timing.start + timing.duration for timing in timings)
+        overlap = sum(timing.duration for timing in timings) - wall
+        return f"{wall:.2f}s total" + (f", {overlap:.2f}s saved by overlapping stages" if overlap > 0.005 else "")
+
+_pipeline_executor: Optional[ThreadPoolExecutor] = None
+_pipeline_executor_lock = threading.Lock()
+
+def get_pipeline_executor() -> ThreadPoolExecutor:
+    """Process-wide thread pool for background pipeline stages"""
+    global _pipeline_executor
+    with _pipeline_executor_lock:
+        if _pipeline_executor is None:
+            _pipeline_executor = ThreadPoolExecutor(max_workers=PIPELINE_WORKERS, thread_name_prefix="pipeline")
+        return _pipeline_executor
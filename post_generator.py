@@ -0,0 +1,151 @@
+import asyncio
+import json
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Union
+
+from gemini_client import (
+    CallStats, generate_content, generate_content_async, generate_variants_async, get_model, stream_text_async
+)
+from prompts import MAX_INPUT_TOKENS, build_template_request
+from response_cache import get_response_cache
+from tracing import get_tracer
+
+@dataclass
+class PostTemplate:
+    name: str
+    description: str
+    structure: str
+    example: str
+
+# Gemini model used for post generation
+TEXT_MODEL = 'gemini-1.5-flash'
+
+# Enhanced templates
+POST_TEMPLATES = {
+    "Industry Insight": PostTemplate(
+        name="Industry Insight",
+        description="Share professional insights and trends",
+        structure="Hook → Insight → Evidence → Call to Action",
+        example="🚀 The remote work revolution isn't slowing down...\n\nHere's what the latest data reveals about the future of work..."
+    ),
+    "Personal Story": PostTemplate(
+        name="Personal Story",
+        description="Share personal experiences and lessons",
+        structure="Story Setup → Challenge → Resolution → Lesson",
+        example="Yesterday, I made a mistake that taught me more than any success...\n\nHere's what happened and what I learned..."
+    ),
+    "Educational Content": PostTemplate(
+        name="Educational Content",
+        description="Teach something valuable to your audience",
+        structure="Problem → Solution Steps → Benefits → Resources",
+        example="Struggling with productivity? Here are 5 science-backed methods that actually work..."
+    ),
+    "Question/Poll": PostTemplate(
+        name="Question/Poll",
+        description="Engage audience with questions",
+        structure="Context → Question → Options → Engagement Ask",
+        example="I've been thinking about the future of AI in our industry...\n\nWhat's your biggest concern? 👇"
+    ),
+    "Achievement/Milestone": PostTemplate(
+        name="Achievement/Milestone",
+        description="Share wins and celebrate progress",
+        structure="Achievement → Journey → Gratitude → Future Goals",
+        example="🎉 Just hit a major milestone that seemed impossible 12 months ago...\n\nHere's how it happened..."
+    ),
+    "Controversial Take": PostTemplate(
+        name="Controversial Take",
+        description="Share bold opinions respectfully",
+        structure="Unpopular Opinion → Reasoning → Evidence → Discussion Invite",
+        example="Unpopular opinion: The 40-hour work week is dead, and here's why that's actually good news..."
+    )
+}
+
+# The sidebar's defaults, for callers that leave settings out
+DEFAULT_SETTINGS = {
+    'tone': "Professional",
+    'length': "Short (100-300 chars)",
+    'industry': "General",
+    'audience': "All Professionals",
+    'hashtags': True,
+    'cta': True,
+    'emojis': True
+}
+
+def resolve_settings(settings: Optional[Dict] = None) -> Dict:
+    """DEFAULT_SETTINGS overridden by the given settings"""
+    return {**DEFAULT_SETTINGS, **(settings or {})}
+
+@dataclass(frozen=True)
+class PostRequest:
+    """A template generation with its prompts built: the unit that is cached, deduplicated and run"""
+    template: str
+    system_instruction: str
+    prompt: str
+    variant_count: int = 1
+
+    @property
+    def cache_model(self) -> str:
+        # Variant sets are cached as a whole, apart from single posts for the same prompt
+        return TEXT_MODEL if self.variant_count == 1 else f"{TEXT_MODEL}:variants={self.variant_count}"
+
+    @property
+    def cache_prompt(self) -> str:
+        return f"{self.system_instruction}\x00{self.prompt}"
+
+def build_post_request(template: PostTemplate, user_input: str, settings: dict, variant_count: int = 1,
+                       max_input_tokens: Optional[int] = MAX_INPUT_TOKENS) -> PostRequest:
+    """Prompts and cache keys for generating from template, user input and settings"""
+    system_instruction, prompt = build_template_request(template, user_input, settings, max_input_tokens)
+    return PostRequest(template.name, system_instruction, prompt, variant_count)
+
+def cached_post(request: PostRequest) -> Optional[Union[str, List[str]]]:
+    """The stored post (or variant list) for request, if the response cache has one"""
+    started = time.perf_counter()
+    cached = get_response_cache().get(request.cache_model, request.cache_prompt)
+    if cached is None:
+        return None
+    get_tracer().record("generate", time.perf_counter() - started, template=request.template,
+                        variants=request.variant_count, cache_hit=True)
+    return json.loads(cached) if request.variant_count > 1 else cached
+
+async def generate_post_async(api_key: str, request: PostRequest, stream: bool = False,
+                              stats: Optional[CallStats] = None,
+                              on_chunk: Optional[Callable[[str], None]] = None) -> Union[str, List[str]]:
+    """Generate request's post, or its variants when variant_count > 1, and store the result in the response cache
+
+    Does not consult the cache first; see cached_post. With stream, on_chunk receives each chunk's text.
+    """
+    with get_tracer().span("generate", template=request.template, variants=request.variant_count, cache_hit=False):
+        # Building the first model for a key imports the SDK and creates its API client
+        model = await asyncio.to_thread(get_model, api_key, TEXT_MODEL, request.system_instruction)
+        if request.variant_count > 1:
+            result = await generate_variants_async(api_key, model, request.prompt, request.variant_count, stats=stats)
+            cached_value = json.dumps(result)
+        elif stream:
+            result = await stream_text_async(api_key, model, request.prompt, stats=stats, on_chunk=on_chunk)
+            cached_value = result
+        else:
+            result = (await generate_content_async(api_key, model, request.prompt, stats=stats)).text
+            cached_value = result
+        await asyncio.to_thread(get_response_cache().set, request.cache_model, request.cache_prompt, cached_value)
+        return result
+
+def generate_content_with_template(api_key: str, template: PostTemplate, user_input: str, settings: dict,
+                                   use_cache: bool = True, stats: Optional[CallStats] = None) -> str:
+    """Generate content using selected template and user input"""
+    with get_tracer().span("generate", template=template.name, cache_hit=False) as attrs:
+        request = build_post_request(template, user_input, settings)
+
+        # Identical requests are served from the on-disk cache without an API round-trip
+        cache = get_response_cache()
+        if use_cache:
+            cached = cache.get(request.cache_model, request.cache_prompt)
+            if cached is not None:
+                attrs['cache_hit'] = True
+                return cached
+
+        model = get_model(api_key, TEXT_MODEL, request.system_instruction)
+        response = generate_content(api_key, model, request.prompt, stats=stats)
+        cache.set(request.cache_model, request.cache_prompt, response.text)
+        return response.text
@@ -0,0 +1,283 @@
+import os
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image, ImageDraw, ImageFont
+
+from image_options import DEFAULT_SIZE
+from tracing import traced
+
+# Font search path: POST_IMAGE_FONT_DIRS (os.pathsep-separated) first, then common system locations
+FONT_DIRS = [d for d in os.environ.get("POST_IMAGE_FONT_DIRS", "").split(os.pathsep) if d] + [
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "fonts"),
+    os.path.expanduser("~/.fonts"),
+    os.path.expanduser("~/.local/share/fonts"),
+    "/usr/share/fonts",
+    "/usr/local/share/fonts",
+    "/Library/Fonts",
+    "/System/Library/Fonts",
+    os.path.join(os.environ.get("WINDIR", r"C:\Windows"), "Fonts"),
+]
+
+# Preferred font files, first match wins
+REGULAR_FONTS = ("arial.ttf", "Arial.ttf", "DejaVuSans.ttf", "LiberationSans-Regular.ttf", "Helvetica.ttc")
+BOLD_FONTS = ("arialbd.ttf", "Arial Bold.ttf", "DejaVuSans-Bold.ttf", "LiberationSans-Bold.ttf") + REGULAR_FONTS
+
+@lru_cache(maxsize=1)
+def _font_index() -> Dict[str, str]:
+    # One directory walk per process; lower-cased file name -> first path found
+    index: Dict[str, str] = {}
+    for directory in FONT_DIRS:
+        if not os.path.isdir(directory):
+            continue
+        for root, _, files in os.walk(directory):
+            for name in files:
+                if name.lower().endswith(('.ttf', '.otf', '.ttc')):
+                    index.setdefault(name.lower(), os.path.join(root, name))
+    return index
+
+@lru_cache(maxsize=None)
+def resolve_font_path(names: Tuple[str, ...] = REGULAR_FONTS) -> Optional[str]:
+    """Path of the first available font file among names, or None"""
+    index = _font_index()
+    for name in names:
+        path = index.get(name.lower())
+        if path:
+            return path
+    return None
+
+@lru_cache(maxsize=64)
+def get_font(size: int, names: Tuple[str, ...] = REGULAR_FONTS) -> ImageFont.ImageFont:
+    """Font loaded once per process for a size and preference list"""
+    path = resolve_font_path(names)
+    if path:
+        try:
+            return ImageFont.truetype(path, size)
+        except OSError:
+            pass
+    return ImageFont.load_default(size)
+
+@lru_cache(maxsize=8192)
+def text_width(font: ImageFont.ImageFont, text: str) -> float:
+    """Memoized advance width of text (used per word when wrapping)"""
+    return font.getlength(text)
+
+@lru_cache(maxsize=4096)
+def text_bbox(font: ImageFont.ImageFont, text: str) -> Tuple[int, int, int, int]:
+    """Memoized bounding box of text drawn at the origin"""
+    return font.getbbox(text)
+
+Color = Tuple[int, int, int]
+
+@dataclass(frozen=True)
+class ImageStyle:
+    top: Color
+    bottom: Color
+    text: Color
+    shadow: Color
+    accent: Color
+
+# Card styles keyed by POST_TEMPLATES name; "professional" is the fallback
+TEMPLATE_STYLES: Dict[str, ImageStyle] = {
+    "professional": ImageStyle((0, 119, 181), (0, 65, 130), (255, 255, 255), (0, 40, 80), (0, 160, 220)),
+    "Industry Insight": ImageStyle((0, 119, 181), (0, 51, 102), (255, 255, 255), (0, 30, 60), (0, 160, 220)),
+    "Personal Story": ImageStyle((196, 90, 60), (110, 40, 60), (255, 255, 255), (70, 20, 30), (255, 190, 120)),
+    "Educational Content": ImageStyle((0, 128, 110), (0, 70, 90), (255, 255, 255), (0, 40, 50), (120, 220, 190)),
+    "Question/Poll": ImageStyle((100, 70, 180), (50, 30, 110), (255, 255, 255), (30, 15, 70), (190, 160, 255)),
+    "Achievement/Milestone": ImageStyle((210, 150, 30), (150, 80, 20), (255, 255, 255), (90, 45, 10), (255, 225, 120)),
+    "Controversial Take": ImageStyle((60, 60, 70), (20, 20, 28), (255, 255, 255), (0, 0, 0), (230, 70, 70)),
+}
+
+def _gradient_column(height: int, top: Color, bottom: Color) -> Image.Image:
+    # One pixel wide; each row gets the same truncated interpolation the per-row loop used
+    data = bytearray()
+    for i in range(height):
+        ratio = i / height
+        data.extend(int(start + (end - start) * ratio) for start, end in zip(top, bottom))
+    return Image.frombytes('RGB', (1, height), bytes(data))
+
+@lru_cache(maxsize=32)
+def gradient_background(size: Tuple[int, int] = DEFAULT_SIZE, style: str = "professional") -> Image.Image:
+    """Vertical gradient for a template style, rendered once per size and style (treat as read-only)"""
+    image_style = TEMPLATE_STYLES.get(style, TEMPLATE_STYLES["professional"])
+    # Nearest-neighbour stretch copies the column across every row
+    return _gradient_column(size[1], image_style.top, image_style.bottom).resize(size, Image.NEAREST)
+
+Box = Tuple[int, int, int, int]
+
+@dataclass(frozen=True)
+class CardLayout:
+    margin: int
+    badge_font_size: int
+    hook_box: Box
+    hook_sizes: Tuple[int, int]
+    points_box: Box
+    points_sizes: Tuple[int, int]
+    footer_y: int
+    footer_font_size: int
+    accent_height: int
+
+@lru_cache(maxsize=None)
+def card_layout(size: Tuple[int, int]) -> CardLayout:
+    """Layout boxes for a card size, computed once"""
+    width, height = size
+    margin = round(width * 0.07)
+    badge_font_size = round(width * 0.02)
+    footer_font_size = round(width * 0.018)
+    top = margin + round(badge_font_size * 2.6)
+    bottom = height - margin - round(footer_font_size * 1.5)
+    content_width = width - 2 * margin
+    # Tall cards give the hook less of the content area so key points get room
+    hook_share = 0.55 if height <= width * 0.6 else 0.42
+    hook_height = round((bottom - top) * hook_share)
+    gap = round(height * 0.03)
+    return CardLayout(
+        margin=margin,
+        badge_font_size=badge_font_size,
+        hook_box=(margin, top, content_width, hook_height),
+        hook_sizes=(round(width * 0.05), round(width * 0.03)),
+        points_box=(margin, top + hook_height + gap, content_width, bottom - top - hook_height - gap),
+        points_sizes=(round(width * 0.032), round(width * 0.022)),
+        footer_y=height - margin,
+        footer_font_size=footer_font_size,
+        accent_height=max(4, round(height * 0.008))
+    )
+
+# Characters the bundled fonts can't draw (emoji, pictographs, joiners) are dropped from card text
+_UNDRAWABLE_RE = re.compile('[\U00010000-\U0010FFFF\u2600-\u27BF\u2B00-\u2BFF\uFE0F\u200D]')
+_BULLET_RE = re.compile(r'^\s*(?:[-•*▪►→]|\d+[.)]|[\U0001F300-\U0001FAFF\u2600-\u27BF]\uFE0F?)\s*')
+
+def _clean_line(line: str) -> str:
+    line = _UNDRAWABLE_RE.sub('', line.replace('**', '').replace('__', ''))
+    return re.sub(r'\s+', ' ', line).strip()
+
+def extract_card_text(text: str, max_points: int = 3) -> Tuple[str, List[str]]:
+    """Hook line and key points to show on the card"""
+    lines = []
+    for raw in text.splitlines():
+        line = _clean_line(raw)
+        # Skip empty and hashtag-only lines
+        if not line or all(word.startswith('#') for word in line.split()):
+            continue
+        lines.append((bool(_BULLET_RE.match(raw)), _clean_line(_BULLET_RE.sub('', raw, count=1))))
+    if not lines:
+        return "LinkedIn Post", []
+
+    hook = lines[0][1]
+    rest = lines[1:]
+    points = [line for is_bullet, line in rest if is_bullet and line]
+    if not points:
+        points = [line for _, line in rest]
+    return hook, points[:max_points]
+
+def wrap_text(text: str, font: ImageFont.ImageFont, max_width: int) -> List[str]:
+    """Greedy word wrap using memoized per-word widths"""
+    space = text_width(font, " ")
+    lines, current, current_width = [], [], 0.0
+    for word in text.split():
+        word_width = text_width(font, word)
+        if current and current_width + space + word_width > max_width:
+            lines.append(" ".join(current))
+            current, current_width = [word], word_width
+        else:
+            current_width += (space if current else 0) + word_width
+            current.append(word)
+    if current:
+        lines.append(" ".join(current))
+    return lines
+
+def fit_text(text: str, box: Box, sizes: Tuple[int, int], names: Tuple[str, ...],
+             line_spacing: float = 1.25) -> Tuple[ImageFont.ImageFont, List[str], int]:
+    """Largest font size whose wrapped text fits the box; truncates at the smallest size"""
+    _, _, box_width, box_height = box
+    largest, smallest = sizes
+    step = max(1, (largest - smallest) // 6)
+    for size in list(range(largest, smallest, -step)) + [smallest]:
+        font = get_font(size, names)
+        line_height = round(size * line_spacing)
+        lines = wrap_text(text, font, box_width)
+        if len(lines) * line_height <= box_height:
+            return font, lines, line_height
+    max_lines = max(1, box_height // line_height)
+    if len(lines) > max_lines:
+        lines = lines[:max_lines]
+        lines[-1] = lines[-1].rstrip(" .,;:") + "…"
+    return font, lines, line_height
+
+@lru_cache(maxsize=512)
+def line_mask(font: ImageFont.ImageFont, text: str) -> Tuple[Image.Image, Tuple[int, int]]:
+    """Rasterized glyph mask for a line and its offset from the text origin (treat as read-only)"""
+    left, top, right, bottom = text_bbox(font, text)
+    mask = Image.new('L', (max(1, right - left), max(1, bottom - top)))
+    ImageDraw.Draw(mask).text((-left, -top), text, font=font, fill=255)
+    return mask, (left, top)
+
+def _draw_lines(img: Image.Image, lines: List[str], x: int, y: int, line_height: int,
+                font: ImageFont.ImageFont, style: ImageStyle, shadow: int) -> int:
+    for line in lines:
+        # Glyphs are rasterized once and composited twice for the shadow effect
+        mask, (left, top) = line_mask(font, line)
+        img.paste(style.shadow, (x + left + shadow, y + top + shadow), mask)
+        img.paste(style.text, (x + left, y + top), mask)
+        y += line_height
+    return y
+
+@traced("image.render")
+def create_post_image(text: str, template_style: str = "professional",
+                      size: Tuple[int, int] = DEFAULT_SIZE) -> Image.Image:
+    """Render a branded card showing the post's hook and key points"""
+    style_name = template_style if template_style in TEMPLATE_STYLES else "professional"
+    style = TEMPLATE_STYLES[style_name]
+    layout = card_layout(size)
+    width, height = size
+
+    # Start from a copy of the cached gradient
+    img = gradient_background(size, style_name).copy()
+    draw = ImageDraw.Draw(img)
+    draw.rectangle((0, 0, width, layout.accent_height), fill=style.accent)
+
+    # Template badge
+    badge_font = get_font(layout.badge_font_size, BOLD_FONTS)
+    badge = ("LinkedIn Post" if style_name == "professional" else style_name).upper()
+    left, top, right, bottom = text_bbox(badge_font, badge)
+    pad = layout.badge_font_size // 2
+    badge_box = (layout.margin, layout.margin, layout.margin + right - left + 2 * pad,
+                 layout.margin + bottom - top + 2 * pad)
+    draw.rounded_rectangle(badge_box, radius=pad, fill=style.accent)
+    draw.text((layout.margin + pad - left, layout.margin + pad - top), badge, font=badge_font, fill=style.shadow)
+
+    hook, points = extract_card_text(text)
+    shadow = max(1, width // 600)
+
+    # Hook line
+    font, lines, line_height = fit_text(hook, layout.hook_box, layout.hook_sizes, BOLD_FONTS)
+    x, y, _, _ = layout.hook_box
+    _draw_lines(img, lines, x, y, line_height, font, style, shadow)
+
+    # Key points as a bulleted list sharing one font size
+    if points:
+        x, y, box_width, box_height = layout.points_box
+        bullet = "• "
+        font, _, line_height = fit_text("\n".join(points), layout.points_box, layout.points_sizes, REGULAR_FONTS)
+        indent = round(text_width(font, bullet))
+        bottom = y + box_height
+        for point in points:
+            point_lines = wrap_text(point, font, box_width - indent)
+            if y + line_height > bottom:
+                break
+            draw.text((x, y), bullet, font=font, fill=style.accent)
+            remaining = max(1, (bottom - y) // line_height)
+            if len(point_lines) > remaining:
+                point_lines = point_lines[:remaining]
+                point_lines[-1] = point_lines[-1].rstrip(" .,;:") + "…"
+            y = _draw_lines(img, point_lines, x + indent, y, line_height, font, style, shadow)
+            y += line_height // 3
+
+    # Footer
+    footer_font = get_font(layout.footer_font_size)
+    draw.text((layout.margin, layout.footer_y), "Generated with AI", font=footer_font, fill=style.accent,
+              anchor="ls")
+
+    return img
@@ -0,0 +1,103 @@
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import List, Tuple
+
+from tracing import get_tracer
+
+@dataclass(frozen=True)
+class PostMetrics:
+    character_count: int
+    word_count: int
+    hashtag_count: int
+    engagement_score: float
+    readability_score: str
+
+# Precompiled single scan: every hashtag, emoji and run of sentence punctuation starts with one of these
+# characters, so the regex engine tests a single character class per position
+EMOJI_RANGES = r'\U0001F600-\U0001F64F\U0001F300-\U0001F5FF\U0001F680-\U0001F6FF\U0001F1E0-\U0001F1FF'
+_TOKEN_RE = re.compile(rf'[#.!?{EMOJI_RANGES}](?:(?<=#)\w+|(?<=[.!?])[.!?]*)?')
+CTA_PHRASES = ('what do you think', 'comment below', 'share your', 'let me know')
+
+# Analyzed posts kept per process, keyed by content hash
+METRICS_CACHE_SIZE = 4096
+_cache: "OrderedDict[bytes, PostMetrics]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+def readability_label(avg_words_per_sentence: float) -> str:
+    if avg_words_per_sentence <= 15:
+        return "Excellent"
+    elif avg_words_per_sentence <= 20:
+        return "Good"
+    elif avg_words_per_sentence <= 25:
+        return "Fair"
+    return "Needs Improvement"
+
+# Tie-breaker weight of each readability label when ranking posts
+READABILITY_POINTS = {"Excellent": 3, "Good": 2, "Fair": 1, "Needs Improvement": 0}
+
+def analyze_post(post_text: str) -> PostMetrics:
+    """Compute post metrics with a single regex scan of the text"""
+    char_count = len(post_text)
+    word_count = len(post_text.split())
+
+    hashtag_count = emoji_count = 0
+    # re.split on [.!?]+ yields one more piece than there are punctuation runs
+    sentences = 1
+    for token in _TOKEN_RE.findall(post_text):
+        first = token[0]
+        if first == '#':
+            # A bare '#' is not a hashtag
+            if len(token) > 1:
+                hashtag_count += 1
+        elif first in '.!?':
+            sentences += 1
+        else:
+            emoji_count += 1
+    lowered = post_text.lower()
+
+    # Simple engagement score calculation
+    engagement_factors = {
+        'question_marks': post_text.count('?') * 2,
+        'exclamation_marks': post_text.count('!') * 1.5,
+        'emojis': emoji_count * 1.2,
+        'call_to_action': 3 if any(cta in lowered for cta in CTA_PHRASES) else 0,
+        'optimal_length': 5 if 100 <= char_count <= 1300 else 0,
+        'hashtags': min(hashtag_count * 0.5, 4)  # Cap at 4 points for hashtags
+    }
+    engagement_score = min(sum(engagement_factors.values()) / 2, 10)  # Scale to 10
+
+    return PostMetrics(
+        character_count=char_count,
+        word_count=word_count,
+        hashtag_count=hashtag_count,
+        engagement_score=engagement_score,
+        readability_score=readability_label(word_count / max(sentences, 1))
+    )
+
+def calculate_post_metrics(post_text: str) -> PostMetrics:
+    """Calculate comprehensive metrics for a post, analyzing each distinct text once"""
+    with get_tracer().span("metrics") as attrs:
+        key = hashlib.blake2b(post_text.encode('utf-8'), digest_size=16).digest()
+        with _cache_lock:
+            metrics = _cache.get(key)
+            if metrics is not None:
+                _cache.move_to_end(key)
+        attrs['cache_hit'] = metrics is not None
+        if metrics is not None:
+            return metrics
+
+        metrics = analyze_post(post_text)
+        with _cache_lock:
+            _cache[key] = metrics
+            if len(_cache) > METRICS_CACHE_SIZE:
+                _cache.popitem(last=False)
+        return metrics
+
+def rank_posts(posts: List[str]) -> List[Tuple[str, PostMetrics]]:
+    """Posts with their metrics, best first by engagement score and then readability"""
+    scored = [(post, calculate_post_metrics(post)) for post in posts]
+    return sorted(scored, key=lambda pair: (pair[1].engagement_score, READABILITY_POINTS[pair[1].readability_score]),
+                  reverse=True)
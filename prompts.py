@@ -0,0 +1,169 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from rate_limiter import estimate_tokens
+from tracing import traced
+
+# Longest user input sent as-is; longer input is cut at a sentence or word boundary
+MAX_INPUT_TOKENS = 2000
+# Below this share of the budget the local estimate is trusted without asking the API
+EXACT_COUNT_THRESHOLD = 0.8
+TRUNCATION_MARKER = " […]"
+
+def compact(text: str) -> str:
+    """Strip indentation and trailing whitespace and drop blank lines"""
+    return "\n".join(line.strip() for line in text.splitlines() if line.strip())
+
+# Exact counts from the API, keyed by model name and text hash
+TOKEN_CACHE_SIZE = 1024
+_token_cache: "OrderedDict[Tuple[str, bytes], int]" = OrderedDict()
+_token_cache_lock = threading.Lock()
+
+def count_tokens(text: str, model=None) -> int:
+    """Token count of text: exact via model.count_tokens (cached per text) when a model is given, else estimated"""
+    if model is None:
+        return estimate_tokens(text)
+    key = (getattr(model, 'model_name', ''), hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest())
+    with _token_cache_lock:
+        count = _token_cache.get(key)
+        if count is not None:
+            _token_cache.move_to_end(key)
+            return count
+    try:
+        count = model.count_tokens(text).total_tokens
+    except Exception:
+        # Counting is advisory; never fail a generation over it
+        return estimate_tokens(text)
+    with _token_cache_lock:
+        _token_cache[key] = count
+        if len(_token_cache) > TOKEN_CACHE_SIZE:
+            _token_cache.popitem(last=False)
+    return count
+
+def needs_exact_count(text: str, max_tokens: int = MAX_INPUT_TOKENS) -> bool:
+    """Whether text is close enough to max_tokens that truncation should ask the model for an exact count"""
+    return estimate_tokens(text) > max_tokens * EXACT_COUNT_THRESHOLD
+
+def truncate_to_tokens(text: str, max_tokens: int = MAX_INPUT_TOKENS, model=None) -> Tuple[str, bool]:
+    """text cut to about max_tokens, and whether it was cut"""
+    if not needs_exact_count(text, max_tokens):
+        return text, False
+    tokens = count_tokens(text, model) if model is not None else estimate_tokens(text)
+    if tokens <= max_tokens:
+        return text, False
+
+    limit = int(len(text) * max_tokens / tokens) - len(TRUNCATION_MARKER)
+    cut = text[:limit]
+    # Prefer ending on a sentence, then on a word, as long as little is lost
+    sentence_end = max(cut.rfind(". "), cut.rfind(".\n"), cut.rfind("! "), cut.rfind("? "))
+    if sentence_end >= limit * 0.8:
+        cut = cut[:sentence_end + 1]
+    elif cut.rfind(" ") >= limit * 0.8:
+        cut = cut[:cut.rfind(" ")]
+    return cut.rstrip() + TRUNCATION_MARKER, True
+
+_TEMPLATE_REQUIREMENTS = compact("""
+    Requirements:
+    - Follow the template structure closely
+    - Make it highly engaging and valuable
+    - Use appropriate emojis strategically (2-4 total)
+    - Use line breaks for readability
+    - Write in a conversational yet professional tone
+""")
+_TEMPLATE_CLOSING = "Make it authentic and compelling for LinkedIn's professional audience."
+
+@dataclass(frozen=True)
+class CompiledTemplate:
+    """A post template's instructions rendered once; per request only the user input and settings vary"""
+    # System instruction per (hashtags, cta) combination; identical strings let models be reused
+    instructions: Dict[Tuple[bool, bool], str]
+
+    def system_instruction(self, settings: dict) -> str:
+        return self.instructions[(bool(settings['hashtags']), bool(settings['cta']))]
+
+    @staticmethod
+    def render_request(user_input: str, settings: dict) -> str:
+        return "".join((
+            "User Input: ", user_input.strip(),
+            "\nSettings:\n- Tone: ", settings['tone'],
+            "\n- Length: ", settings['length'],
+            "\n- Industry Focus: ", settings.get('industry', 'General'),
+            "\n- Target Audience: ", settings.get('audience', 'LinkedIn professionals')
+        ))
+
+def _requirement_lines(hashtags: bool, cta: bool, positive: Tuple[str, str], negative: Tuple[str, str]) -> str:
+    return "\n".join((positive[0] if hashtags else negative[0], positive[1] if cta else negative[1]))
+
+_compiled: Dict[Tuple[str, str], CompiledTemplate] = {}
+_compiled_lock = threading.Lock()
+
+def compile_template(template) -> CompiledTemplate:
+    """Compiled instructions for a PostTemplate, built once per name and structure"""
+    key = (template.name, template.structure)
+    compiled = _compiled.get(key)
+    if compiled is not None:
+        return compiled
+    head = f'Create a LinkedIn post using the "{template.name}" template structure: {compact(template.structure)}'
+    instructions = {}
+    for hashtags in (True, False):
+        for cta in (True, False):
+            instructions[(hashtags, cta)] = "\n".join((
+                head,
+                _TEMPLATE_REQUIREMENTS,
+                _requirement_lines(
+                    hashtags, cta,
+                    ('- Include 5-8 relevant hashtags at the end', '- Include a clear call-to-action'),
+                    ('- No hashtags', '- No call-to-action needed')
+                ),
+                _TEMPLATE_CLOSING
+            ))
+    with _compiled_lock:
+        return _compiled.setdefault(key, CompiledTemplate(instructions=instructions))
+
+@traced("prompt.build")
+def build_template_request(template, user_input: str, settings: dict,
+                           max_input_tokens: Optional[int] = MAX_INPUT_TOKENS) -> Tuple[str, str]:
+    """System instruction and per-request prompt for a template, user input and settings
+
+    max_input_tokens=None sends user_input as given, for callers that already truncated it.
+    """
+    if max_input_tokens is not None:
+        user_input, _ = truncate_to_tokens(user_input, max_input_tokens)
+    compiled = compile_template(template)
+    return compiled.system_instruction(settings), compiled.render_request(user_input, settings)
+
+def _topic_instruction(hashtags: bool, cta: bool) -> str:
+    return "\n".join((
+        compact("""
+            Create an engaging LinkedIn post based on the user's input, in the requested tone and length.
+            Requirements:
+            - Target audience: LinkedIn professionals
+            - Make it engaging and valuable
+            - Use line breaks for readability
+            - Start with a hook to grab attention
+        """),
+        _requirement_lines(
+            hashtags, cta,
+            ('- Include 5-8 relevant hashtags at the end', '- Include a clear call-to-action'),
+            ('- Do not include hashtags', '- Do not include call-to-action')
+        ),
+        "Format the post to be ready for LinkedIn posting."
+    ))
+
+# main.py's instructions only vary with the hashtag and call-to-action toggles
+TOPIC_INSTRUCTIONS = {(hashtags, cta): _topic_instruction(hashtags, cta)
+                      for hashtags in (True, False) for cta in (True, False)}
+
+@traced("prompt.build")
+def build_topic_request(base_prompt: str, tone: str, length: str, hashtags: bool, cta: bool,
+                        max_input_tokens: int = MAX_INPUT_TOKENS) -> Tuple[str, str, bool]:
+    """System instruction, per-request prompt and whether the input was cut, for main.py's free-form posts
+
+    The user's text keeps its own line breaks and indentation; only the fixed instructions are compacted.
+    """
+    base_prompt, truncated = truncate_to_tokens(base_prompt.strip(), max_input_tokens)
+    return (TOPIC_INSTRUCTIONS[(bool(hashtags), bool(cta))], f"{base_prompt}\nTone: {tone}\nLength: {length}",
+            truncated)
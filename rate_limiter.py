@@ -0,0 +1,167 @@
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+# Gemini free-tier quotas; paid tiers (or a local fake endpoint) override them from the environment
+REQUESTS_PER_MINUTE = int(os.environ.get("GEMINI_REQUESTS_PER_MINUTE", 15))
+REQUESTS_PER_DAY = int(os.environ.get("GEMINI_REQUESTS_PER_DAY", 1500))
+TOKENS_PER_MINUTE = int(os.environ.get("GEMINI_TOKENS_PER_MINUTE", 1_000_000))
+
+# Expected response size used when reserving tokens before a call
+DEFAULT_OUTPUT_TOKENS = 512
+
+class RateLimitExceeded(Exception):
+    """Raised when a request would have to wait longer than the caller allows"""
+
+    def __init__(self, wait_seconds: float, bucket: str):
+        self.wait_seconds = wait_seconds
+        self.bucket = bucket
+        super().__init__(
+            f"Rate limit reached ({bucket}); next request possible in {wait_seconds:.0f}s"
+        )
+
+@dataclass
+class RateLimitStatus:
+    requests_minute: int
+    requests_day: int
+    tokens_minute: int
+
+class TokenBucket:
+    """Continuously refilling bucket holding up to capacity units"""
+
+    def __init__(self, name: str, capacity: float, period_seconds: float):
+        self.name = name
+        self.capacity = capacity
+        self.rate = capacity / period_seconds
+        self.available = capacity
+        self.updated_at = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        self.available = min(self.capacity, self.available + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def wait_time(self, amount: float) -> float:
+        # Requests larger than the bucket only need a full bucket to proceed
+        amount = min(amount, self.capacity)
+        if self.available >= amount:
+            return 0.0
+        return (amount - self.available) / self.rate
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token)"""
+    return max(1, len(text) // 4)
+
+class RateLimiter:
+    """Client-side limiter for requests/minute, requests/day and tokens/minute"""
+
+    def __init__(self, requests_per_minute: int = REQUESTS_PER_MINUTE, requests_per_day: int = REQUESTS_PER_DAY,
+                 tokens_per_minute: int = TOKENS_PER_MINUTE):
+        self._lock = threading.Lock()
+        self._requests_minute = TokenBucket("requests per minute", requests_per_minute, 60)
+        self._requests_day = TokenBucket("requests per day", requests_per_day, 24 * 60 * 60)
+        self._tokens_minute = TokenBucket("tokens per minute", tokens_per_minute, 60)
+
+    def _try_acquire(self, tokens: int, waited: float, max_wait: float) -> float:
+        """Reserve the request if every quota allows it now (returns 0), else the seconds to wait first"""
+        with self._lock:
+            now = time.monotonic()
+            needed = [
+                (self._requests_minute, 1),
+                (self._requests_day, 1),
+                (self._tokens_minute, tokens)
+            ]
+            for bucket, _ in needed:
+                bucket.refill(now)
+            wait, bucket = max(
+                ((bucket.wait_time(amount), bucket) for bucket, amount in needed), key=lambda pair: pair[0]
+            )
+            if wait == 0:
+                for bucket, amount in needed:
+                    bucket.available -= amount
+                return 0.0
+            if waited + wait > max_wait:
+                raise RateLimitExceeded(wait, bucket.name)
+            return wait
+
+    def acquire(self, tokens: int = 0, max_wait: float = 90.0) -> float:
+        """Block until a request fits in every quota and reserve it; returns seconds waited"""
+        start = time.monotonic()
+        while True:
+            wait = self._try_acquire(tokens, time.monotonic() - start, max_wait)
+            if wait == 0:
+                return time.monotonic() - start
+            time.sleep(min(wait, 1.0))
+
+    async def acquire_async(self, tokens: int = 0, max_wait: float = 90.0) -> float:
+        """acquire() for event loops: waiting requests sleep on the loop instead of holding a thread"""
+        start = time.monotonic()
+        while True:
+            wait = self._try_acquire(tokens, time.monotonic() - start, max_wait)
+            if wait == 0:
+                return time.monotonic() - start
+            await asyncio.sleep(min(wait, 1.0))
+
+    def reserve(self, prompt: str, max_wait: float = 90.0) -> int:
+        """Acquire quota for a prompt plus its expected response; returns the tokens reserved"""
+        reserved = estimate_tokens(prompt) + DEFAULT_OUTPUT_TOKENS
+        self.acquire(reserved, max_wait=max_wait)
+        return reserved
+
+    async def reserve_async(self, prompt: str, max_wait: float = 90.0) -> int:
+        """Async reserve()"""
+        reserved = estimate_tokens(prompt) + DEFAULT_OUTPUT_TOKENS
+        await self.acquire_async(reserved, max_wait=max_wait)
+        return reserved
+
+    def record_usage(self, reserved_tokens: int, actual_tokens: Optional[int]) -> None:
+        """Correct a token reservation once the real usage is known"""
+        if actual_tokens is None:
+            return
+        with self._lock:
+            self._tokens_minute.refill(time.monotonic())
+            # May go negative, which delays later requests until the overshoot refills
+            self._tokens_minute.available += reserved_tokens - actual_tokens
+
+    def status(self) -> RateLimitStatus:
+        with self._lock:
+            now = time.monotonic()
+            for bucket in (self._requests_minute, self._requests_day, self._tokens_minute):
+                bucket.refill(now)
+            return RateLimitStatus(
+                requests_minute=int(self._requests_minute.available),
+                requests_day=int(self._requests_day.available),
+                tokens_minute=int(self._tokens_minute.available)
+            )
+
+def response_token_count(response) -> Optional[int]:
+    """Total tokens billed for a response, when the API reports usage metadata"""
+    usage = getattr(response, 'usage_metadata', None)
+    return getattr(usage, 'total_token_count', None) or None
+
+# Limiters are kept per API key, so the service bounds them: a limiter idle for a day has refilled every
+# bucket and is dropped without losing quota; past the size cap the least recently used one is dropped
+LIMITER_CACHE_SIZE = int(os.environ.get("GEMINI_LIMITER_CACHE_SIZE", 1024))
+LIMITER_IDLE_SECONDS = 24 * 60 * 60
+
+_limiters: "OrderedDict[str, Tuple[float, RateLimiter]]" = OrderedDict()
+_limiters_lock = threading.Lock()
+
+def get_rate_limiter(api_key: str) -> RateLimiter:
+    """Process-wide limiter shared by every session using the same API key"""
+    key_id = hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+    now = time.monotonic()
+    with _limiters_lock:
+        entry = _limiters.get(key_id)
+        limiter = entry[1] if entry is not None and now - entry[0] < LIMITER_IDLE_SECONDS else RateLimiter()
+        _limiters[key_id] = (now, limiter)
+        _limiters.move_to_end(key_id)
+        # Entries are in last-use order, so idle ones are at the front
+        while _limiters and (len(_limiters) > LIMITER_CACHE_SIZE
+                             or now - next(iter(_limiters.values()))[0] >= LIMITER_IDLE_SECONDS):
+            _limiters.popitem(last=False)
+        return limiter
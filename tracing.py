@@ -0,0 +1,130 @@
+import functools
+import json
+import math
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional
+
+# Most recent spans kept in memory; older ones are dropped
+TRACE_BUFFER_SIZE = int(os.environ.get("POST_TRACE_BUFFER", "5000"))
+
+@dataclass
+class Span:
+    name: str
+    # Wall-clock start (epoch seconds) for correlating with logs; duration from perf_counter
+    start: float
+    duration: float
+    error: Optional[str] = None
+    attrs: Dict[str, Any] = field(default_factory=dict)
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self), ensure_ascii=False, default=str)
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile of already sorted values"""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[max(0, math.ceil(len(sorted_values) * q) - 1)]
+
+class Tracer:
+    """Ring buffer of timed spans around the app's hot paths
+
+    Recording is a perf_counter pair and a deque append, cheap enough to leave on in production.
+    """
+
+    def __init__(self, capacity: int = TRACE_BUFFER_SIZE):
+        self._spans: Deque[Span] = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+
+    @property
+    def capacity(self) -> int:
+        return self._spans.maxlen
+
+    def record(self, name: str, duration: float, start: Optional[float] = None, error: Optional[str] = None,
+               **attrs) -> None:
+        span = Span(name, start if start is not None else time.time() - duration, duration, error, attrs)
+        with self._lock:
+            self._spans.append(span)
+
+    @contextmanager
+    def span(self, name: str, **attrs) -> Iterator[Dict[str, Any]]:
+        """Time the block; the yielded dict takes attributes known only inside it (tokens, cache hits)"""
+        start = time.time()
+        started = time.perf_counter()
+        error = None
+        try:
+            yield attrs
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            self.record(name, time.perf_counter() - started, start, error, **attrs)
+
+    def spans(self, name: Optional[str] = None) -> List[Span]:
+        with self._lock:
+            spans = list(self._spans)
+        return [span for span in spans if name is None or span.name == name]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._spans.clear()
+
+    def summary(self) -> List[Dict]:
+        """Per-span-name latency percentiles, error and cache-hit counts and tokens, for display"""
+        by_name: Dict[str, List[Span]] = {}
+        for span in self.spans():
+            by_name.setdefault(span.name, []).append(span)
+        rows = []
+        for name, spans in sorted(by_name.items()):
+            durations = sorted(span.duration * 1000 for span in spans)
+            cache_flags = [span.attrs['cache_hit'] for span in spans if 'cache_hit' in span.attrs]
+            rows.append({
+                'Stage': name,
+                'Count': len(spans),
+                'p50 (ms)': round(percentile(durations, 0.5), 2),
+                'p95 (ms)': round(percentile(durations, 0.95), 2),
+                'Max (ms)': round(durations[-1], 2),
+                'Errors': sum(span.error is not None for span in spans),
+                'Cache Hits': f"{sum(cache_flags)}/{len(cache_flags)}" if cache_flags else "",
+                'Tokens': sum(span.attrs.get('total_tokens') or 0 for span in spans)
+            })
+        return rows
+
+    def to_jsonl(self) -> str:
+        """Buffered spans, oldest first, one JSON object per line"""
+        return "".join(span.to_json() + "\n" for span in self.spans())
+
+def usage_attrs(response) -> Dict[str, int]:
+    """Token counts from a Gemini response's usage metadata, when it reports any"""
+    usage = getattr(response, 'usage_metadata', None)
+    counts = {
+        'prompt_tokens': getattr(usage, 'prompt_token_count', None),
+        'output_tokens': getattr(usage, 'candidates_token_count', None),
+        'total_tokens': getattr(usage, 'total_token_count', None)
+    }
+    return {key: value for key, value in counts.items() if isinstance(value, int)}
+
+def traced(name: str) -> Callable[[Callable], Callable]:
+    """Decorator recording a span around each call of a plain (non-generator) function"""
+    def decorator(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with get_tracer().span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+_default_tracer: Optional[Tracer] = None
+_default_tracer_lock = threading.Lock()
+
+def get_tracer() -> Tracer:
+    """Process-wide tracer shared by every session"""
+    global _default_tracer
+    with _default_tracer_lock:
+        if _default_tracer is None:
+            _default_tracer = Tracer()
+        return _default_tracer